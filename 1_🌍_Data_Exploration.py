@@ -1,20 +1,121 @@
 import streamlit as st
+import pyarrow as pa
 import pyarrow.parquet as pq
 import pandas as pd
+import numpy as np
 import os
+import re
+from scripts.aed_index import load_aed_index
+from scripts.coverage import coverage_counts, within_radius
+from scripts.parquet_dataset import ParquetDataset
 from scripts.paths import LOCATION_PATH
+from scripts.storage import read_table
 
 st.set_page_config(page_title="Data Exploration", page_icon="🌍", layout='wide')
 
+# Rows of the selected file shown at once
+PAGE_SIZE = 1000
+
 @st.cache_data
-def load_data(file_path):
-    df = pd.read_csv(file_path)
+def load_data(directory, name):
+    df = read_table(directory, name)
     return df
 
-def format_coordinates(longitude, latitude):
-    formatted_longitude = str(longitude)[:1] + '.' + str(longitude).replace('.', '')[1:]
-    formatted_latitude = str(latitude)[:2] + '.' + str(latitude).replace('.', '')[2:]
-    return formatted_longitude, formatted_latitude
+@st.cache_resource
+def load_dataset(path):
+    # One handle per file, shared by every session, keeps the columns, distinct values and searches it computed
+    return ParquetDataset(path)
+
+@st.cache_resource
+def load_index(aed_csv):
+    # The index is memory mapped, so every session and Streamlit process shares one copy
+    return load_aed_index(aed_csv)
+
+@st.cache_data
+def load_aed_counts_within_radius(arrests_df, aed_csv, radius_km):
+    index = load_index(aed_csv)
+    return coverage_counts(within_radius(arrests_df[['lat', 'lon']].values, index.locations, radius_km, tree=index.tree))
+
+# Centralized file-specific configurations
+file_configs = {
+    'interventions3.parquet.gzip': {
+        'event_types': [
+            "P003 - Cardiac arrest",
+            "P014 - Electrocution - electrification",
+            "P019 - Unconscious - syncope",
+            "P011 - Chest pain"
+        ],
+        'columns': {
+            'longitude': "Longitude intervention",
+            'latitude': "Latitude intervention",
+            'event': "EventType Trip"
+        }
+    },
+    'interventions1.parquet.gzip': {
+        'event_types': [
+            "P003 - Cardiac arrest",
+            "P014 - Electrocution - electrification",
+            "P019 - Unconscious - syncope",
+            "P011 - Chest pain"
+        ],
+        'columns': {
+            'longitude': "Longitude intervention",
+            'latitude': "Latitude intervention",
+            'event': "EventType Trip"
+        }
+    },
+    'interventions_bxl2.parquet.gzip': {
+        'event_types': [
+            'HARTSTILSTAND - DOOD - OVERLEDEN',
+            'PIJN OP DE BORST',
+            'CARDIAAL PROBLEEM (ANDERE DAN PIJN AAN DE BORST)'
+        ],
+        'columns': {
+            'longitude': "Longitude intervention",
+            'latitude': "Latitude intervention",
+            'event': "EventType and EventLevel"
+        }
+    },
+    'interventions_bxl.parquet.gzip': {
+        'event_types': [
+            'P003 - Cardiac arrest',
+            'P019 - Unconscious - syncope',
+            'P011 - Chest pain',
+            'P029 - Obstruction of the respiratory tract',
+            'P014 - Electrocution - electrification',
+            'TI (3.3.1) rescue electrocution/electrification'
+        ],
+        'columns': {
+            'longitude': "longitude_intervention",
+            'latitude': "latitude_intervention",
+            'event': "eventtype_trip"
+        }
+    }
+}
+
+def normalise_coordinates(longitude, latitude):
+    # Coordinates are stored without their decimal point (e.g. 4406731 or 50855160000.0),
+    # put it back after the first digit of longitudes and the second digit of latitudes
+    longitude = pd.to_numeric(longitude, errors='coerce')
+    latitude = pd.to_numeric(latitude, errors='coerce')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (longitude / 10 ** np.floor(np.log10(longitude.abs())),
+                latitude / 10 ** (np.floor(np.log10(latitude.abs())) - 1))
+
+def event_pattern(event_types):
+    # Matches events containing any of the event types
+    return '|'.join(re.escape(event_type) for event_type in event_types)
+
+@st.cache_data
+def load_map_data(data_directory, selected_file, cardiac_only):
+    # Locations of the interventions in one pass over the needed columns, cached per file and filter
+    columns = file_configs[selected_file]['columns']
+    df = pq.read_table(os.path.join(data_directory, selected_file), columns=list(columns.values())).to_pandas()
+    if cardiac_only:
+        is_interesting = df[columns['event']].str.contains(event_pattern(file_configs[selected_file]['event_types']), regex=True, na=False)
+        df = df[is_interesting.astype(bool)]
+    longitude, latitude = normalise_coordinates(df[columns['longitude']], df[columns['latitude']])
+    return pd.DataFrame({'lat': latitude, 'lon': longitude}).dropna().reset_index(drop=True)
 
 def show_data_exploration(data_directory):
     st.title('🌍 Data Exploration')
@@ -27,151 +128,81 @@ def show_data_exploration(data_directory):
     # Let the user select a file
     selected_file = st.selectbox('Select a file', parquet_files)
 
-    # Open the selected Parquet file
-    parquet_file = pq.ParquetFile(os.path.join(data_directory, selected_file))
+    # Open the selected Parquet file, columns are only read when needed
+    dataset = load_dataset(os.path.join(data_directory, selected_file))
 
-    # Read the data from the Parquet file
-    table = parquet_file.read()
+    st.write("Data Types of Each Column:", dataset.dtypes)
 
-    # Convert the table to a pandas DataFrame
-    df = table.to_pandas()
+    # Get the list of columns from the schema
+    columns = dataset.columns
 
-    st.write("Data Types of Each Column:", df.dtypes)
-
-    # After the DataFrame is loaded, get the list of columns
-    columns = df.columns.tolist()
-
-    # Let the user select a column from the loaded DataFrame
+    # Let the user select a column from the dataset
     selected_column = st.selectbox('Select a column', columns)
 
     # Display the distinct values of the selected column
     if selected_column:
-        distinct_values = df[selected_column].dropna().unique()
-        distinct_values.sort()
+        distinct_values = dataset.distinct_values(selected_column).to_numpy(zero_copy_only=False)
         st.write(f"Distinct values in '{selected_column}':", distinct_values)
 
+        # Precomputed statistics, if the file was profiled with scripts.dataset_profile
+        statistics = dataset.statistics(selected_column)
+        if statistics is not None:
+            st.write(f"Statistics of '{selected_column}':", {name: value for name, value in statistics.items() if name != 'top'})
+            st.write(f"Most frequent values in '{selected_column}':", pd.DataFrame(statistics['top']))
+
     # Add a search input field for the user to enter a search term
     search_term = st.text_input("Enter a search term to filter the data")
 
-    # Filter the DataFrame based on the search term and the selected column
+    # Filter the rows based on the search term and the selected column
+    positions = None
     if search_term:
-        filtered_df = df[df[selected_column].astype(str).str.contains(search_term, case=False)]
+        try:
+            positions = dataset.search(selected_column, search_term)
+        except pa.ArrowInvalid:
+            st.warning(f"'{search_term}' is not a valid regular expression, showing all rows")
+    row_count = len(positions) if positions is not None else dataset.num_rows
+
+    # Display one page of the filtered rows
+    pages = max(1, -(-row_count // PAGE_SIZE))
+    page = st.number_input(f'Page (of {pages}, {row_count} rows)', min_value=1, max_value=pages, value=1)
+    start, stop = (page - 1) * PAGE_SIZE, page * PAGE_SIZE
+    if positions is not None:
+        st.write(dataset.rows(positions[start:stop]))
     else:
-        filtered_df = df
-
-    # Display the data types of each column in the DataFrame
-
-    # Display the filtered DataFrame
-    st.write(filtered_df)
-
-     # Centralized file-specific configurations
-    file_configs = {
-        'interventions3.parquet.gzip': {
-            'event_types': [
-                "P003 - Cardiac arrest",
-                "P014 - Electrocution - electrification",
-                "P019 - Unconscious - syncope",
-                "P011 - Chest pain"
-            ],
-            'columns': {
-                'longitude': "Longitude intervention",
-                'latitude': "Latitude intervention",
-                'event': "EventType Trip"
-            }
-        },
-        'interventions1.parquet.gzip': {
-            'event_types': [
-                "P003 - Cardiac arrest",
-                "P014 - Electrocution - electrification",
-                "P019 - Unconscious - syncope",
-                "P011 - Chest pain"
-            ],
-            'columns': {
-                'longitude': "Longitude intervention",
-                'latitude': "Latitude intervention",
-                'event': "EventType Trip"
-            }
-        },
-        'interventions_bxl2.parquet.gzip': {
-            'event_types': [
-                'HARTSTILSTAND - DOOD - OVERLEDEN',
-                'PIJN OP DE BORST',
-                'CARDIAAL PROBLEEM (ANDERE DAN PIJN AAN DE BORST)'
-            ],
-            'columns': {
-                'longitude': "Longitude intervention",
-                'latitude': "Latitude intervention",
-                'event': "EventType and EventLevel"
-            }
-        },
-        'interventions_bxl.parquet.gzip': {
-            'event_types': [
-                'P003 - Cardiac arrest',
-                'P019 - Unconscious - syncope',
-                'P011 - Chest pain',
-                'P029 - Obstruction of the respiratory tract',
-                'P014 - Electrocution - electrification',
-                'TI (3.3.1) rescue electrocution/electrification'
-            ],
-            'columns': {
-                'longitude': "longitude_intervention",
-                'latitude': "latitude_intervention",
-                'event': "eventtype_trip"
-            }
-        }
-    }
-
-    # Common function to process and display map data
-    def process_and_display_map_data(df, selected_file, show_cardiac_incidences):
-        map_data = pd.DataFrame(columns=['lat', 'lon'])
-        config = file_configs[selected_file]
-
-        for index, row in df.iterrows():
-            current_longitude = row[config['columns']['longitude']]
-            current_latitude = row[config['columns']['latitude']]
-            if pd.isnull(current_longitude) or pd.isnull(current_latitude):
-                continue
-
-            current_longitude, current_latitude = format_coordinates(current_longitude, current_latitude)
-
-            if show_cardiac_incidences == 'Yes':
-                is_interesting = any(event_type in row[config['columns']['event']] for event_type in config['event_types']) if row[config['columns']['event']] else False
-                if is_interesting:
-                    map_data = pd.concat([map_data, pd.DataFrame({'lat': [float(current_latitude)], 'lon': [float(current_longitude)]})], ignore_index=True)
-            else:
-                map_data = pd.concat([map_data, pd.DataFrame({'lat': [float(current_latitude)], 'lon': [float(current_longitude)]})], ignore_index=True)
-
-        if not map_data.empty:
-            st.map(map_data)
-
+        st.write(dataset.rows(start=start, stop=stop))
 
     # Process and display map data based on the selected file
     if selected_file in file_configs:
         # Show cardiac incidences radio button
         show_cardiac_incidences = st.radio("Show cardiac related incidences", ('Yes', 'No'), index=0)
-        process_and_display_map_data(df, selected_file, show_cardiac_incidences)
+        map_data = load_map_data(data_directory, selected_file, show_cardiac_incidences == 'Yes')
+        if not map_data.empty:
+            st.map(map_data)
     
     st.divider()
     st.title('Results')
-    st.write('After some cleanup we managed to create a consolided CSV of cardiac arrests')
+    st.write('After some cleanup we managed to create a consolidated table of cardiac arrests')
     
-    arrests_df = load_data(LOCATION_PATH / 'arrests.csv')
+    arrests_df = load_data(LOCATION_PATH, 'arrests')
 
     # Assuming the DataFrame has 'latitude' and 'longitude' columns
     arrests_map_data = arrests_df[['lat', 'lon']]
 
     # Display the map
     st.map(arrests_map_data)
-    
 
-
-
-
-def format_coordinates(longitude, latitude):
-    formatted_longitude = str(longitude)[:1] + '.' + str(longitude).replace('.', '')[1:]
-    formatted_latitude = str(latitude)[:2] + '.' + str(latitude).replace('.', '')[2:]
-    return formatted_longitude, formatted_latitude
+    # Show how many arrests have enough existing AEDs close by
+    st.write('Coverage of the cardiac arrests by existing AEDs')
+    col1, col2 = st.columns(2)
+    with col1:
+        coverage_radius = st.slider('Radius around the arrest (in m)', 100, 1000, 400, step=50)
+    with col2:
+        min_aeds = st.slider('Minimum number of AEDs within the radius', 1, 5, 1)
+    aed_counts = load_aed_counts_within_radius(arrests_df, 'old_aeds.csv', coverage_radius / 1000)
+    covered = (aed_counts >= min_aeds).sum()
+    st.metric('Covered arrests', f'{covered} / {len(aed_counts)}', f'{covered / len(aed_counts) * 100:.1f}%')
     
 
+
 data_directory = "./data"
 show_data_exploration(data_directory)
\ No newline at end of file
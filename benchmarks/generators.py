@@ -0,0 +1,131 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from scripts.extract_arrests import SOURCES, normalise_column_name
+from scripts.grid import BELGIUM_BOUNDS
+
+# (lat, lon, share of the urban points) of the largest cities, arrests and AEDs cluster around them
+CITIES = [
+    (50.8467, 4.3525, 0.30),  # Brussels
+    (51.2194, 4.4025, 0.20),  # Antwerp
+    (51.0543, 3.7174, 0.12),  # Ghent
+    (50.6326, 5.5797, 0.12),  # Liège
+    (50.4108, 4.4446, 0.10),  # Charleroi
+    (51.2093, 3.2247, 0.06),  # Bruges
+    (50.8798, 4.7005, 0.05),  # Leuven
+    (50.4674, 4.8720, 0.05),  # Namur
+]
+URBAN_SHARE = 0.7
+CITY_SPREAD_DEGREES = 0.08
+
+EVENT_TYPES = ['P011 - Hartstilstand - Arrêt cardiaque', 'P003 - Cardiac problem', 'P019 - Pijn op de borst',
+               'P033 - TRAUMA', 'P032 - Allergie', None]
+ABANDON_REASONS = ['Overleden', 'Dood ter plaatse', 'Weigering vervoer', None]
+TIMESTAMP_COLUMNS = ['T0', 'T1', 'T1confirmed', 'T2', 'T3', 'T4', 'T5', 'T6', 'T7', 'T9']
+
+
+def synthetic_locations(size, seed=0):
+    # (lat, lon) locations in Belgium: most around the cities, the rest spread over the country
+    rng = np.random.default_rng(seed)
+    lat_min, lat_max, lon_min, lon_max = BELGIUM_BOUNDS
+    cities = np.array([city[:2] for city in CITIES])
+    shares = np.array([city[2] for city in CITIES])
+
+    urban = rng.random(size) < URBAN_SHARE
+    city = rng.choice(len(CITIES), size, p=shares / shares.sum())
+    lat = np.where(urban, rng.normal(cities[city, 0], CITY_SPREAD_DEGREES), rng.uniform(lat_min, lat_max, size))
+    lon = np.where(urban, rng.normal(cities[city, 1], CITY_SPREAD_DEGREES), rng.uniform(lon_min, lon_max, size))
+    return pd.DataFrame({'lat': np.clip(lat, lat_min, lat_max), 'lon': np.clip(lon, lon_min, lon_max)})
+
+
+def synthetic_arrests(size, seed=0):
+    return synthetic_locations(size, seed)
+
+
+def synthetic_aeds(size, seed=1):
+    # AEDs are rounded like the addresses they are geocoded from, so some share a location
+    return synthetic_locations(size, seed).round(4)
+
+
+def synthetic_candidates(size, seed=2):
+    return synthetic_locations(size, seed)
+
+
+def _with_nulls(values, rng, share=0.05):
+    values = pd.Series(values).astype(object)
+    values[values.isna() | (rng.random(len(values)) < share)] = None
+    return values
+
+
+def _sas_timestamps(timestamps):
+    return timestamps.dt.strftime('%d%b%y:%H:%M:%S').str.upper()
+
+
+def _iso_timestamps(timestamps, rng, offset='+00:00'):
+    fraction = pd.Series(rng.integers(0, 10 ** 7, len(timestamps))).astype(str).str.zfill(7)
+    return timestamps.dt.strftime('%Y-%m-%d %H:%M:%S') + '.' + fraction + ' ' + offset
+
+
+def _timestamps(timestamps, timestamp_format, rng):
+    if timestamp_format == 'sas':
+        return _sas_timestamps(timestamps)
+    values = _iso_timestamps(timestamps, rng)
+    if timestamp_format == 'iso_offset':
+        # Part of the timestamps are in local time with their offset
+        shifted = rng.random(len(timestamps)) < 0.3
+        values[shifted] = _iso_timestamps(timestamps + pd.Timedelta(hours=2), rng, '+02:00')[shifted]
+    return values
+
+
+def synthetic_interventions(rows, source, source_number, seed=0):
+    # Intervention file with the raw column names and value formats of one of the SOURCES of extract_arrests
+    rng = np.random.default_rng(seed + source_number)
+    locations = synthetic_locations(rows, seed + source_number)
+    events = pd.Series(rng.choice(EVENT_TYPES, rows), dtype='string')
+    levels = pd.Series(rng.integers(1, 8, rows))
+
+    df = pd.DataFrame({'Mission ID': np.arange(rows) + 10 ** 10 * source_number})
+    if source.get('merge_languages'):
+        # Event level inside the event type (e.g. P011 N01 - ...), coordinates scaled by 10^9 and 10^10
+        # and the text columns in Dutch and French
+        df['EventType and EventLevel'] = _with_nulls(events.str.slice(0, 4) + ' N0' + levels.astype(str) + events.str.slice(4), rng, 0)
+        df['Latitude intervention'] = _with_nulls(locations['lat'] * 10 ** 9, rng)
+        df['Longitude intervention'] = locations['lon'] * 10 ** 10
+        df['Vector type NL'] = rng.choice(['AMB', 'MUG', 'PIT'], rows)
+        df['Vector type FR'] = None
+        df['Abandon reason NL'] = rng.choice(ABANDON_REASONS, rows)
+        df['Abandon reason FR'] = _with_nulls(df['Abandon reason NL'], rng, 0.5)
+    else:
+        # Coordinates scaled by 10^5
+        df['EventType Trip'] = _with_nulls(events, rng, 0)
+        df['EventLevel Trip'] = _with_nulls('N' + levels.astype(str), rng)
+        df['Latitude intervention'] = _with_nulls(locations['lat'] * 10 ** 5, rng)
+        df['Longitude intervention'] = locations['lon'] * 10 ** 5
+        df['Calculated travelTime destinatio'] = _with_nulls(rng.uniform(0, 3000, rows), rng)
+        df['Waiting time'] = _with_nulls(rng.uniform(-5, 40, rows), rng, 0.5)
+        df['Abandon reason'] = rng.choice(ABANDON_REASONS, rows)
+        df['Vector type'] = rng.choice(['AMB', 'MUG', 'PIT'], rows)
+    if 'calculated_distance_destination_' in source.get('renames', {}):
+        df['Calculated distance destination )'] = rng.uniform(0, 20, rows)
+
+    # A few minutes between the consecutive timestamps of an intervention
+    start = pd.Series(pd.Timestamp('2022-06-01') + pd.to_timedelta(rng.integers(0, 86400 * 180, rows), unit='s'))
+    for offset, column in enumerate(TIMESTAMP_COLUMNS):
+        timestamp_format = source['timestamps'].get(normalise_column_name(column))
+        if timestamp_format is not None:
+            timestamps = start + pd.to_timedelta(offset * 60 + rng.integers(0, 60, rows), unit='s')
+            df[column] = _with_nulls(_timestamps(timestamps, timestamp_format, rng), rng)
+    return df
+
+
+def write_synthetic_interventions(path, rows_per_source, sources=SOURCES, seed=0):
+    # One intervention file per source, so load_arrests can run on them with data_path=path
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    for source_number, source in enumerate(sources, start=1):
+        df = synthetic_interventions(rows_per_source, source, source_number, seed)
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), path / source['file'], compression='gzip')
+    return path
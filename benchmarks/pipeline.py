@@ -0,0 +1,156 @@
+import argparse
+import atexit
+import json
+import platform
+import resource
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from benchmarks.generators import synthetic_aeds, synthetic_arrests, synthetic_candidates, write_synthetic_interventions
+from scripts.calculate_vital_distances import calculate_distances_chunked
+from scripts.candidate_locations import generate_candidate_locations
+from scripts.clustering import _fit_centers
+from scripts.compare_vital_distances import closer_new_aeds
+from scripts.extract_arrests import SOURCES, load_arrests
+from scripts.spatial_index import build_tree, nearest_locations
+
+RESULTS_PATH = Path(__file__).parent / 'results'
+SIZES = [10000, 100000, 1000000]
+# Number of AEDs in old_aeds.csv and of potential AEDs in the new_aeds_*.csv files
+AED_COUNT = 14000
+NEW_AED_COUNT = 10000
+COVERAGE_RADIUS_KM = 0.4
+# The exact distance computation is quadratic, so it only runs up to this many arrests
+MAX_EXACT_SIZE = 10000
+
+
+def measure(function, repeat):
+    # Fastest of repeat untraced runs, and in one traced run the peak of the memory allocated by Python and numpy.
+    # Arrow allocates outside of tracemalloc, so the traced run goes through its own Arrow memory pool to get
+    # the peak of the Arrow memory as well. The peak resident set size covers the whole process up to this run.
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    default_pool = pa.default_memory_pool()
+    arrow_pool = pa.proxy_memory_pool(default_pool)
+    pa.set_memory_pool(arrow_pool)
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        pa.set_memory_pool(default_pool)
+    return {
+        'seconds': min(times),
+        'peak_memory_mb': peak / 1024 ** 2,
+        'arrow_peak_memory_mb': arrow_pool.max_memory() / 1024 ** 2,
+        # ru_maxrss is in kilobytes on Linux
+        'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def extract_case(size):
+    # Extract the arrests from intervention files with size rows in total, spread over the sources
+    path = write_synthetic_interventions(tempfile.mkdtemp(prefix='benchmark_'), size // len(SOURCES))
+    atexit.register(shutil.rmtree, path, ignore_errors=True)
+    return {'extract_arrests': lambda: load_arrests(path)}
+
+
+def vital_distances_case(size):
+    arrests = synthetic_arrests(size).values
+    aeds = synthetic_aeds(AED_COUNT).values
+    cases = {'calculate_vital_distances': lambda: nearest_locations(arrests, aeds)}
+    if size <= MAX_EXACT_SIZE:
+        cases['calculate_vital_distances_chunked'] = lambda: calculate_distances_chunked(arrests, aeds, chunk_size=1000)
+    return cases
+
+
+def compare_case(size):
+    # Distances are computed once up front, only the comparison itself is measured
+    arrests = synthetic_arrests(size)
+    new_aeds, old_aeds = synthetic_candidates(NEW_AED_COUNT), synthetic_aeds(AED_COUNT)
+    new_distances, old_distances = [
+        pd.DataFrame(dict(zip(['index', 'distance'], nearest_locations(arrests.values, aeds.values)))) for aeds in [new_aeds, old_aeds]
+    ]
+    old_tree = build_tree(old_aeds.values)
+    return {
+        'compare_vital_distances': lambda: closer_new_aeds(new_distances, old_distances, new_aeds, old_aeds, arrests),
+        'compare_vital_distances_radius': lambda: closer_new_aeds(
+            new_distances, old_distances, new_aeds, old_aeds, arrests, COVERAGE_RADIUS_KM, old_tree=old_tree),
+    }
+
+
+def candidates_case(size):
+    # size candidates, 100 around each center
+    centers = synthetic_arrests(size // 100).values
+    return {
+        'generate_candidate_locations': lambda: generate_candidate_locations(centers, 0.5, 100, rng=0),
+        'generate_candidate_locations_within_belgium': lambda: generate_candidate_locations(centers, 0.5, 100, rng=0, within_belgium=True),
+    }
+
+
+def centers_case(size):
+    # Fit without the cache of get_centers_of_gravity, so every run clusters
+    arrests = synthetic_arrests(size).round(5).values
+    return {'get_centers_of_gravity': lambda: _fit_centers(arrests, 100, 0, True, True, 4096)}
+
+
+CASES = {
+    'extract': extract_case,
+    'vital_distances': vital_distances_case,
+    'compare': compare_case,
+    'candidates': candidates_case,
+    'centers': centers_case,
+}
+
+
+def run_benchmarks(sizes=SIZES, cases=CASES, repeat=3):
+    # cases maps the name of every case to the function building its benchmarks for a size
+    results = []
+    for case, build_case in cases.items():
+        for size in sizes:
+            for name, function in build_case(size).items():
+                print(f'Running {name} on {size} points')
+                results.append({'case': case, 'name': name, 'size': size, **measure(function, repeat)})
+    return results
+
+
+def save_results(results, output=None):
+    output = Path(output) if output is not None else RESULTS_PATH / f'{datetime.now():%Y%m%d-%H%M%S}.json'
+    output.parent.mkdir(parents=True, exist_ok=True)
+    metadata = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'pyarrow': pa.__version__,
+    }
+    with open(output, 'w') as f:
+        json.dump({'metadata': metadata, 'results': results}, f, indent=2)
+    return output
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time and memory-profile the pipeline steps on synthetic Belgium-scale data')
+    parser.add_argument('--sizes', nargs='+', type=int, default=SIZES, help='number of points (arrests, interventions or candidates)')
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES), help='pipeline steps to run')
+    parser.add_argument('--repeat', type=int, default=3, help='number of timed runs, the fastest one is reported')
+    parser.add_argument('--output', type=Path, help='JSON file to save the results to, by default in benchmarks/results')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.sizes, {case: CASES[case] for case in args.cases}, args.repeat)
+    for result in results:
+        print(f'{result["name"]:<45} {result["size"]:>8} {result["seconds"]:>9.3f} s {result["peak_memory_mb"]:>9.1f} MB '
+              f'{result["arrow_peak_memory_mb"]:>9.1f} MB Arrow {result["max_rss_mb"]:>9.1f} MB RSS')
+    print(f'Saved results to {save_results(results, args.output)}')
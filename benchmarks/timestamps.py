@@ -0,0 +1,70 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from scripts.timestamps import parse_timestamps
+
+
+def pandas_parse_timestamps(values, timestamp_format):
+    # Previous implementation in extract_arrests, used as reference
+    if timestamp_format == 'sas':
+        return pd.to_datetime(values, format='%d%b%y:%H:%M:%S')
+    if timestamp_format == 'iso':
+        return pd.to_datetime(values.str.replace('+00:00', '').str.strip(), format='%Y-%m-%d %H:%M:%S.%f')
+    dt_col = values.str.replace('+00:00', '')
+    hour_shift = dt_col.str.extract(r'\+(\d+):00', expand=False).astype(float).fillna(0)
+    return pd.to_datetime(
+        dt_col.str.replace(r'\+(\d+):00', '', regex=True).str.strip(), format='%Y-%m-%d %H:%M:%S.%f'
+    ) - pd.to_timedelta(hour_shift, unit='h')
+
+
+def synthetic_timestamps(rows, timestamp_format, seed=0):
+    # Strings like the ones in the intervention files, with 5% missing values
+    rng = np.random.default_rng(seed)
+    timestamps = pd.Series(pd.Timestamp('2022-01-01') + pd.to_timedelta(rng.integers(0, 365 * 86400, rows), unit='s'))
+    if timestamp_format == 'sas':
+        values = timestamps.dt.strftime('%d%b%y:%H:%M:%S').str.upper()
+    else:
+        fraction = pd.Series(rng.integers(0, 10 ** 7, rows)).astype(str).str.zfill(7)
+        shifted = (rng.random(rows) < 0.3) if timestamp_format == 'iso_offset' else np.zeros(rows, dtype=bool)
+        timestamps = timestamps.where(~shifted, timestamps + pd.Timedelta(hours=2))
+        offset = pd.Series(np.where(shifted, '+02:00', '+00:00'))
+        values = timestamps.dt.strftime('%Y-%m-%d %H:%M:%S') + '.' + fraction + ' ' + offset
+    return values.astype(object).where(rng.random(rows) >= 0.05, None)
+
+
+def best_time(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def benchmark_timestamps(rows=1000000, repeat=3):
+    results = []
+    for timestamp_format in ['sas', 'iso', 'iso_offset']:
+        values = synthetic_timestamps(rows, timestamp_format)
+        array = pa.array(values, type=pa.string())
+        pandas_time, expected = best_time(lambda: pandas_parse_timestamps(values.astype('str'), timestamp_format), repeat)
+        arrow_time, parsed = best_time(lambda: parse_timestamps(array, timestamp_format), repeat)
+
+        # Both parsers should give exactly the same timestamps
+        parsed = pd.Series(parsed.to_pandas(), dtype='datetime64[ns]')
+        pd.testing.assert_series_equal(parsed, expected.astype('datetime64[ns]'), check_names=False)
+        results.append({
+            'format': timestamp_format, 'rows': rows, 'pandas_seconds': pandas_time, 'arrow_seconds': arrow_time,
+            'speedup': pandas_time / arrow_time
+        })
+    return pd.DataFrame(results)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the Arrow timestamp parser with the previous pandas parser')
+    parser.add_argument('--rows', type=int, default=1000000, help='number of timestamps per format')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs, the fastest one is reported')
+    args = parser.parse_args()
+    print(benchmark_timestamps(args.rows, args.repeat).to_string(index=False))
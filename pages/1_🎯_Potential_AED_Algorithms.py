@@ -3,12 +3,13 @@ import streamlit as st
 import os
 import numpy as np
 import pandas as pd
-import geopandas as gpd
 from pyproj import Proj, transform
-from shapely.geometry import Point, Polygon
 from geopy.distance import geodesic
-from sklearn.cluster import KMeans
-from scripts.paths import LOCATION_PATH
+from scripts.candidate_locations import generate_candidate_locations
+from scripts.clustering import get_centers_of_gravity
+from scripts.grid import adaptive_grid, regular_grid
+from scripts.paths import LOCATION_PATH, TRANSFORMED_DATA_PATH
+from scripts.storage import read_table, write_table
 
 st.set_page_config(page_title="Possible AED Algorithms", page_icon="🎯", layout='wide')
 
@@ -17,8 +18,8 @@ wgs84 = Proj('epsg:4326')  # WGS84 (longitude, latitude)
 utm32n = Proj('epsg:32632')  # UTM zone 32N (Cartesian system)
 
 @st.cache_data
-def load_data(file_path):
-    df = pd.read_csv(file_path)
+def load_data(directory, name):
+    df = read_table(directory, name)
     return df
 
 
@@ -36,40 +37,31 @@ a simple grid-based system and a more advanced K-means clustering method.
     st.text("""
 The grid-based system generates a grid of latitude and longitude points within defined geographical boundaries, providing a straightforward, evenly distributed set of potential AED locations.""")
 
-    # Define Belgium's boundary using a simplified polygon or use an actual shapefile
-    # This is not implemented yet, but you can use the commented line below as a starting point
-    # gdf_belgium = gpd.read_file('./be_1km.shp') 
+    grid_type = st.radio('Grid type', ['Regular', 'Adaptive'], help='The adaptive grid splits cells with many cardiac arrests into finer cells, quadtree-style')
 
-    # Define the latitude and longitude boundaries for the area of interest
-    lat_start, lat_end = 49.5, 51.5
-    lon_start, lon_end = 2.5, 6.4
+    # Clip the grid to the cells of the Belgian 1 km reference grid (be_1km)
+    within_belgium = st.checkbox('Only keep grid points within Belgium', value=True)
 
-    # Define the number of points in the latitude and longitude directions
-    # Increase these numbers to make the mesh finer
-    lat_points, lon_points = 100, 100 
+    if grid_type == 'Regular':
+        # Define the number of points in the latitude and longitude directions
+        # Increase these numbers to make the mesh finer
+        lat_points, lon_points = 100, 100
 
-    # Generate a grid of latitude and longitude points within the defined boundaries
-    latitudes = np.linspace(lat_start, lat_end, lat_points)
-    longitudes = np.linspace(lon_start, lon_end, lon_points)
-    lat_grid, lon_grid = np.meshgrid(latitudes, longitudes)
-    coordinates = np.vstack([lat_grid.ravel(), lon_grid.ravel()]).T
+        # Generate a grid of latitude and longitude points within the defined boundaries
+        map_df = regular_grid(lat_points=lat_points, lon_points=lon_points, within_belgium=within_belgium)
+    else:
+        col1, col2 = st.columns(2)
+        with col1:
+            max_depth = st.number_input('Maximum number of refinements', min_value=0, max_value=8, value=4)
+        with col2:
+            max_arrests_per_cell = st.number_input('Refine cells with more cardiac arrests than', min_value=1, max_value=1000, value=25)
 
-    # Convert the grid points to a GeoDataFrame for further processing
-    points = [Point(lon, lat) for lon, lat in coordinates]
-    gdf_points = gpd.GeoDataFrame(geometry=points, crs='epsg:4326')
+        # Refine a 20x20 grid where the arrest density is high
+        df_arrests = load_data(LOCATION_PATH, 'arrests')
+        map_df = adaptive_grid(df_arrests[['lat', 'lon']].values, max_depth=max_depth, max_arrests_per_cell=max_arrests_per_cell, within_belgium=within_belgium)
 
-    # Extract the latitude and longitude from the GeoDataFrame and convert to a list
-    map_data = gdf_points.geometry.apply(lambda p: {
-        'lon': p.x,
-        'lat': p.y
-    }).tolist()
-
-    # Convert the list to a DataFrame for easier manipulation and saving
-    map_df = pd.DataFrame(map_data)
-    map_df.columns = ['lat', 'lon']
-
-    # Save the DataFrame to a CSV file for future use
-    map_df.to_csv('transformed_data/potential_aed_locations.csv', index=False)
+    # Save the DataFrame for future use
+    write_table(map_df, TRANSFORMED_DATA_PATH, 'potential_aed_locations')
 
     # Display the DataFrame in the Streamlit app
     st.write("Here are the potential AED locations:")
@@ -93,20 +85,25 @@ You can customize the number of centers of gravity, the number of candidate loca
     # radius = 2  # in km
     radius = st.number_input('Radius around the center of gravity (in km)', min_value=1, max_value=100, value=2)
 
+    # Define the seed of the random candidate locations, so results can be reproduced
+    seed = st.number_input('Random seed', min_value=0, value=0)
+    within_belgium = st.checkbox('Only keep candidate locations within Belgium', value=True)
+    mini_batch = st.checkbox('Use mini-batch k-means (faster on large data sets)', value=True)
+
     if st.button('Run clustering'):
         data_load_state = st.text('Loading data...')
-        df_interventions = load_data(LOCATION_PATH / 'arrests.csv')
+        df_interventions = load_data(LOCATION_PATH, 'arrests')
         data_load_state.text('Loading data...done!')
         # Define the number of centers of gravity
         # Get the centers of gravity
-        centers = get_centers_of_gravity(df_interventions, N)
+        centers = get_centers_of_gravity(df_interventions, N, seed=seed, mini_batch=mini_batch)
 
 
         # Generate candidate locations
-        df_potential_locations = generate_candidate_locations(centers, radius, num_points_per_center)
+        df_potential_locations = generate_candidate_locations(centers, radius, num_points_per_center, rng=seed, within_belgium=within_belgium)
 
-        # Save the DataFrame to a CSV file for future use
-        df_potential_locations.to_csv('transformed_data/centers_of_gravity_potential_aed_locations.csv', index=False)
+        # Save the DataFrame for future use
+        write_table(df_potential_locations, TRANSFORMED_DATA_PATH, 'centers_of_gravity_potential_aed_locations')
 
         # Display the DataFrame in the Streamlit app
         st.write("Here are the potential AED locations based on centers of gravity:")
@@ -115,36 +112,6 @@ You can customize the number of centers of gravity, the number of candidate loca
         # Display the potential AED locations on a map in the Streamlit app
         st.map(df_potential_locations)
 
-def get_centers_of_gravity(df, N):
-    # Run K-means clustering
-    kmeans = KMeans(n_clusters=N, random_state=0).fit(df[['lat', 'lon']])
-
-    # Get the centers of gravity
-    centers = kmeans.cluster_centers_
-
-    return centers
-
-def generate_candidate_locations(centers, radius, num_points):
-    # Initialize an empty DataFrame to store the potential AED locations
-    df_potential_locations = pd.DataFrame(columns=['lat', 'lon'])
-
-    # Iterate over the centers of gravity
-    for center in centers:
-        # Generate points within the circle
-        for _ in range(num_points):
-            # Generate a random radius and angle
-            r = radius * np.sqrt(np.random.rand())
-            angle = 2 * np.pi * np.random.rand()
-
-            # Calculate the new latitude and longitude
-            new_lat = center[0] + r * np.cos(angle) / 111.32  # divide by 111.32 to convert km to degrees
-            new_lon = center[1] + r * np.sin(angle) / (111.32 * np.cos(center[0]))  # divide by 111.32*cos(lat) to convert km to degrees
-
-            # Add the new location to the DataFrame
-            df_potential_locations.loc[len(df_potential_locations)] = [new_lat, new_lon]
-
-    return df_potential_locations
-
 def format_coordinates(longitude):
     # This function is used to format the longitude to 6 decimal places
     formatted_longitude = "{:.6f}".format(longitude)
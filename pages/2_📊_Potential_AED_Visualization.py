@@ -1,18 +1,79 @@
 import streamlit as st
 import pandas as pd
+from collections import namedtuple
 import folium
+from folium.plugins import FastMarkerCluster
 from streamlit_folium import st_folium
-import ast
 import plotly.express as px
-from scripts.paths import COMPARE_PATH
+from scripts.add_province import get_regions
+from scripts.compare_vital_distances import long_layout, read_comparison
+from scripts.greedy_placement import greedy_placement
+from scripts.grid import BELGIUM_BOUNDS
+from scripts.paths import COMPARE_PATH, DISTANCE_PATH, LOCATION_PATH
+from scripts.spatial_index import nearest_locations
+from scripts.storage import read_table, table_path
 
 st.set_page_config(page_title="Potential AED Visualization", page_icon="🎯", layout='wide')
 
+# Potential AED markers are built in the browser from plain [lat, lon, id, arrest count, province] rows
+# and clustered per zoom level, so only the markers in view are drawn however many potential AEDs there are
+POTENTIAL_AED_CALLBACK = """
+function (row) {
+    var icon = L.AwesomeMarkers.icon({icon: 'info-sign', markerColor: 'green', prefix: 'glyphicon'});
+    var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: icon});
+    marker.bindPopup('Potential AED ID: ' + row[2] + '<br>Arrest Count: ' + row[3] + '<br>Province: ' + row[4], {maxWidth: 300});
+    return marker;
+}
+"""
+
 @st.cache_data
-def load_data(file_path):
-    df = pd.read_csv(file_path)
+def load_data(directory, name):
+    df = read_table(directory, name)
     return df
 
+@st.cache_data
+def load_greedy_placement(new_aed_csv, budget, old_aed_csv='old_aeds.csv'):
+    # Placed AEDs with their location and region, and the number of arrests closer to one of them than to
+    # their closest existing AED, counting every arrest once
+    arrest_locations = load_data(LOCATION_PATH, 'arrests')[['lat', 'lon']].values
+    candidate_locations = load_data(LOCATION_PATH, new_aed_csv)[['lat', 'lon']].values
+    old_distances = load_data(DISTANCE_PATH, old_aed_csv)['distance'].values
+    placement = greedy_placement(arrest_locations, candidate_locations, old_distances, budget)
+    placed_locations = candidate_locations[placement['potential_aed_id']]
+    placement['potential_aed_lat'], placement['potential_aed_lon'] = placed_locations[:, 0], placed_locations[:, 1]
+    placement['Province'] = get_regions(placement)
+    _, new_distances = nearest_locations(arrest_locations, placed_locations)
+    return placement.set_index('potential_aed_id', drop=False).rename_axis(None), int((new_distances < old_distances).sum())
+
+def potential_aed_map(potential_aeds):
+    # The base map only changes with the potential AEDs shown, the selection is drawn on top of it
+    # and moved to with the center and zoom of st_folium, so the browser does not rebuild the map
+    lat_min, lat_max, lon_min, lon_max = BELGIUM_BOUNDS
+    m = folium.Map(location=[(lat_min + lat_max) / 2, (lon_min + lon_max) / 2], zoom_start=8)
+    rows = potential_aeds[['potential_aed_lat', 'potential_aed_lon', 'potential_aed_id', 'arrest_count', 'Province']]
+    FastMarkerCluster(rows.astype(object).where(rows.notna(), '').values.tolist(), callback=POTENTIAL_AED_CALLBACK, name='Potential AEDs').add_to(m)
+    return m
+
+def read_comparison_layout(name):
+    # Prefer the normalised layout, otherwise split the comparison with list columns into it
+    if table_path(COMPARE_PATH, f'{name}__pairs').exists() and table_path(COMPARE_PATH, f'{name}__summary__with_province').exists():
+        return read_table(COMPARE_PATH, f'{name}__summary__with_province'), read_table(COMPARE_PATH, f'{name}__pairs')
+    return long_layout(read_comparison(f'{name}__with_province'))
+
+# Summary (one row per potential AED, ranked by arrest count and indexed by potential AED id) and pairs of a
+# comparison, with the row of every intervention in the pairs. Every intervention is grouped under the one
+# potential AED closest to it, so intervention ids are unique.
+Comparison = namedtuple('Comparison', ['grouped_interventions', 'intervention_pairs', 'intervention_rows'])
+
+@st.cache_resource
+def load_comparison(name):
+    # Built once and shared without copies (the frames are never modified), so a rerun after selecting a
+    # potential AED or intervention only does hash lookups
+    grouped_interventions, intervention_pairs = read_comparison_layout(name)
+    grouped_interventions = grouped_interventions.sort_values('arrest_count', ascending=False, kind='stable')
+    grouped_interventions = grouped_interventions.set_index('potential_aed_id', drop=False).rename_axis(None)
+    return Comparison(grouped_interventions, intervention_pairs, pd.Index(intervention_pairs['intervention_id']))
+
 
 def show_potential_locations_visualization():
     st.title('Visualizing Optimal Potential AED Locations')
@@ -31,57 +92,50 @@ Additionally, users can enter a specific potential AED ID to view the details of
     optimal_num = st.slider('How many potential AEDs you are looking for?', 50, 200, 50, step=50)
     algorithm = st.radio('Select the algorithm', ['Grid-based', 'Clustering'])
 
-    # Load the grouped interventions data based on the selected algorithm
-    if algorithm == 'Grid-based':
-        grouped_interventions = pd.read_csv(COMPARE_PATH / "new_aeds_grid__old_aeds__with_province.csv")
-    else:  # Clustering
-        grouped_interventions = pd.read_csv(COMPARE_PATH / "new_aeds_cluster__old_aeds__with_province.csv")  # adjust this path to your clustering results
+    # Load the grouped interventions data based on the selected algorithm, one row per potential AED
+    # with the offset of its interventions in intervention_pairs
+    comparison = "new_aeds_grid__old_aeds" if algorithm == 'Grid-based' else "new_aeds_cluster__old_aeds"
+    grouped_interventions, intervention_pairs, intervention_rows = load_comparison(comparison)
 
-    optimal_potential_aeds = grouped_interventions.nlargest(optimal_num, 'arrest_count')
-    st.write(f"**With a budget of {optimal_num} AEDs, {algorithm} algorithm shortens the distance to the closest AED for {optimal_potential_aeds['arrest_count'].sum()} cardiac arrests**")
-   
-    # Convert stringified lists to actual lists
-    optimal_potential_aeds['intervention_lat'] = optimal_potential_aeds['intervention_lat'].apply(eval)
-    optimal_potential_aeds['intervention_lon'] = optimal_potential_aeds['intervention_lon'].apply(eval)
-    optimal_potential_aeds['existing_aed_lat'] = optimal_potential_aeds['existing_aed_lat'].apply(eval)
-    optimal_potential_aeds['existing_aed_lon'] = optimal_potential_aeds['existing_aed_lon'].apply(eval)
-    optimal_potential_aeds['intervention_id'] = optimal_potential_aeds['intervention_id'].apply(eval)
-    optimal_potential_aeds['existing_aed_id'] = optimal_potential_aeds['existing_aed_id'].apply(eval)
-    optimal_potential_aeds['distance_to_existing_aed'] = optimal_potential_aeds['distance_to_existing_aed'].apply(ast.literal_eval)
-    optimal_potential_aeds['distance_to_potential_aed'] = optimal_potential_aeds['distance_to_potential_aed'].apply(ast.literal_eval)
+    ranking = st.radio('Select the ranking', ['Arrest count', 'Greedy placement'], help='Greedy placement adds AEDs one by one where they reduce the total distance to the closest AED the most, so arrests are not counted twice')
+
+    if ranking == 'Arrest count':
+        optimal_potential_aeds = grouped_interventions.iloc[:optimal_num]
+        improved_arrest_count = optimal_potential_aeds['arrest_count'].sum()
+    else:
+        # Every placed AED is shown with the arrests it improved when it was placed, the comparison is only
+        # used for the interventions of the selected one
+        optimal_potential_aeds, improved_arrest_count = load_greedy_placement('new_aeds_grid.csv' if algorithm == 'Grid-based' else 'new_aeds_cluster.csv', optimal_num)
+        st.write(f"**Greedy placement reduces the total distance to the closest AED by {optimal_potential_aeds['distance_reduction'].sum():.1f} km**")
+    st.write(f"**With a budget of {optimal_num} AEDs, {algorithm} algorithm shortens the distance to the closest AED for {improved_arrest_count} cardiac arrests**")
 
     # Define function to add markers for interventions
-    def add_intervention_markers(selected_potential_aed):
+    def add_intervention_markers(selected_interventions):
         fg = folium.FeatureGroup(name="Nearest Interventions")
-        nearest_intervention = optimal_potential_aeds[optimal_potential_aeds['potential_aed_id'] == selected_potential_aed]
-        for _, row in nearest_intervention.iterrows():
-            for lat1, lon1, intervention_id, existing_aed_id in zip(row['intervention_lat'], row['intervention_lon'], row['intervention_id'], row['existing_aed_id']):
-                fg.add_child(
-                    folium.Marker(
-                        location=[lat1, lon1],
-                        tooltip=f"Intervention ID: {intervention_id}",
-                        icon=folium.Icon(color='red', icon='heart')
-                    )
+        for lat1, lon1, intervention_id in zip(selected_interventions['intervention_lat'], selected_interventions['intervention_lon'], selected_interventions['intervention_id']):
+            fg.add_child(
+                folium.Marker(
+                    location=[lat1, lon1],
+                    tooltip=f"Intervention ID: {intervention_id}",
+                    icon=folium.Icon(color='red', icon='heart')
                 )
-            for lat2, lon2, existing_aed_id in zip(row['existing_aed_lat'], row['existing_aed_lon'], row['existing_aed_id']):
-                fg.add_child(
-                    folium.Marker(
-                        location=[lat2, lon2],
-                        tooltip=f"Existing AED ID: {existing_aed_id}",
-                        icon=folium.Icon(color='blue', icon='flash')
-                    )
+            )
+        for lat2, lon2, existing_aed_id in zip(selected_interventions['existing_aed_lat'], selected_interventions['existing_aed_lon'], selected_interventions['existing_aed_id']):
+            fg.add_child(
+                folium.Marker(
+                    location=[lat2, lon2],
+                    tooltip=f"Existing AED ID: {existing_aed_id}",
+                    icon=folium.Icon(color='blue', icon='flash')
                 )
+            )
         return fg
     
-    def center_of_map(selected_potential_aed, selected_intervention_id):
+    def center_of_map(selected_intervention_id):
         if selected_intervention_id == '--':
-            selected_aed_location = optimal_potential_aeds[optimal_potential_aeds['potential_aed_id'] == selected_potential_aed][['potential_aed_lat', 'potential_aed_lon']].values[0]
+            selected_aed_location = selected_aed_data[['potential_aed_lat', 'potential_aed_lon']].astype(float).tolist()
             return selected_aed_location
         elif selected_intervention_id != '--':
-            intervention_index = selected_aed_data['intervention_id'].index(selected_intervention_id)
-            intervention_lat1 = selected_aed_data['intervention_lat'][intervention_index]
-            intervention_lon1 = selected_aed_data['intervention_lon'][intervention_index]
-            intervention_location = (intervention_lat1, intervention_lon1)
+            intervention_location = (selected_intervention['intervention_lat'], selected_intervention['intervention_lon'])
             return intervention_location
     
     def zoom(selected_intervention_id):
@@ -94,43 +148,38 @@ Additionally, users can enter a specific potential AED ID to view the details of
     potential_aed_ids = optimal_potential_aeds['potential_aed_id']
     selected_potential_aed = st.selectbox('Enter your interested potential AED ID', list(potential_aed_ids))
 
-    # Check if the input value is valid
-    if selected_potential_aed not in optimal_potential_aeds['potential_aed_id'].values:
+    # Check if the input value is valid, the potential AEDs are indexed by their id
+    if selected_potential_aed not in optimal_potential_aeds.index:
         st.warning("Please enter a valid potential AED ID, we still provide you the most optimal result:)")
         selected_potential_aed = int(optimal_potential_aeds['potential_aed_id'].iloc[0])
     # Filter the data for the selected potential AED
-    selected_aed_data = optimal_potential_aeds[optimal_potential_aeds['potential_aed_id'] == selected_potential_aed].iloc[0]
+    selected_aed_data = optimal_potential_aeds.loc[selected_potential_aed]
     arrest_count_output = selected_aed_data['arrest_count']
     st.write(f"**Great select! This potential AED location optimizes the distances from {arrest_count_output} intervention locations**")
 
-    # Filter intervention IDs for the selected potential AED
-    intervention_ids = selected_aed_data['intervention_id'] 
+    # Slice the interventions of the selected potential AED by its offset in the comparison,
+    # a placed AED that is not the closest potential AED of any intervention has none
+    if selected_potential_aed in grouped_interventions.index:
+        offset, length = grouped_interventions.loc[selected_potential_aed, ['offset', 'length']]
+        selected_interventions = intervention_pairs.iloc[offset:offset + length]
+    else:
+        selected_interventions = intervention_pairs.iloc[:0]
+    intervention_ids = selected_interventions['intervention_id']
     selected_intervention_id = st.selectbox('Select your interested cardiac arrest ID.', ["--"] + list(intervention_ids))
+    if selected_intervention_id != '--':
+        selected_intervention = intervention_pairs.iloc[intervention_rows.get_loc(selected_intervention_id)]
     
-    dynamic_center = center_of_map(selected_potential_aed, selected_intervention_id)
+    dynamic_center = center_of_map(selected_intervention_id)
     dynamic_zoom = zoom(selected_intervention_id)
-    nearest_intervention_fg = add_intervention_markers(selected_potential_aed)
+    nearest_intervention_fg = add_intervention_markers(selected_interventions)
 
-    # Create a map centered around the location of the selected potential AED with adjusted zoom level
-    m = folium.Map(location=dynamic_center, zoom_start=dynamic_zoom)
-
-    # Add markers for potential AEDs
-    for _, row in optimal_potential_aeds.iterrows():
-        intervention_ids = ', '.join(map(str, row['intervention_id']))
-        popup_content = f"Potential AED ID: {row['potential_aed_id']}<br>Arrest Count: {row['arrest_count']}<br>Province: {row['Province']}"
-        folium.Marker(
-            location=[row['potential_aed_lat'], row['potential_aed_lon']],
-            popup=folium.Popup(popup_content, max_width=300),
-            icon=folium.Icon(color='green', icon='info-sign')
-        ).add_to(m)
+    # Map of the potential AEDs, centered around the location of the selected potential AED with adjusted zoom level
+    m = potential_aed_map(optimal_potential_aeds)
 
     if selected_intervention_id != '--':
-        # Get the index of the selected intervention ID
-        intervention_index = selected_aed_data['intervention_id'].index(selected_intervention_id)
-
         # Get the corresponding distances
-        distance_to_existing_aed = selected_aed_data['distance_to_existing_aed'][intervention_index]
-        distance_to_potential_aed = selected_aed_data['distance_to_potential_aed'][intervention_index]
+        distance_to_existing_aed = selected_intervention['distance_to_existing_aed']
+        distance_to_potential_aed = selected_intervention['distance_to_potential_aed']
         
         reduction = round((distance_to_existing_aed - distance_to_potential_aed) * 1000, 2)
 
@@ -138,27 +187,27 @@ Additionally, users can enter a specific potential AED ID to view the details of
         st.write(f"**By setting the potential AED {selected_aed_data['potential_aed_id']}, we shorten {reduction} meters from your selected cardiac arrest location.**")
 
         # Get the coordinates for lines
-        intervention_lat = selected_aed_data['intervention_lat'][intervention_index]
-        intervention_lon = selected_aed_data['intervention_lon'][intervention_index]
+        intervention_lat = selected_intervention['intervention_lat']
+        intervention_lon = selected_intervention['intervention_lon']
         potential_aed_lat = selected_aed_data['potential_aed_lat']
         potential_aed_lon = selected_aed_data['potential_aed_lon']
-        existing_aed_lat = selected_aed_data['existing_aed_lat'][intervention_index]
-        existing_aed_lon = selected_aed_data['existing_aed_lon'][intervention_index]
+        existing_aed_lat = selected_intervention['existing_aed_lat']
+        existing_aed_lon = selected_intervention['existing_aed_lon']
 
-        # Add lines to the map
-        folium.PolyLine(
+        # Add lines from the intervention to both AEDs
+        nearest_intervention_fg.add_child(folium.PolyLine(
             locations=[[intervention_lat, intervention_lon], [potential_aed_lat, potential_aed_lon]],
             color='green',
             weight=2.5,
             opacity=1
-        ).add_to(m)
+        ))
 
-        folium.PolyLine(
+        nearest_intervention_fg.add_child(folium.PolyLine(
             locations=[[intervention_lat, intervention_lon], [existing_aed_lat, existing_aed_lon]],
             color='blue',
             weight=2.5,
             opacity=1
-        ).add_to(m)
+        ))
 
     # Plotly scatter plot
     fig = px.scatter(
@@ -185,9 +234,13 @@ Additionally, users can enter a specific potential AED ID to view the details of
         st.plotly_chart(fig, use_container_width=True)
     
     with col2:
+        # Panning and zooming stay in the browser, the page only reruns on the widgets
         st_folium(
             m,
+            center=dynamic_center,
+            zoom=dynamic_zoom,
             feature_group_to_add=nearest_intervention_fg,
+            returned_objects=[],
             width=600,
             height=600,
             )
@@ -9,6 +9,7 @@ from sklearn.metrics import accuracy_score, confusion_matrix, ConfusionMatrixDis
 import matplotlib.pyplot as plt
 import plotly.graph_objects as go
 from scripts.paths import INFORMATION_PATH
+from scripts.storage import read_table
 
 st.set_page_config(page_title="Predict patient survival from waiting time", page_icon="🔮", layout='wide')
 
@@ -17,7 +18,8 @@ st.title('Predict patient survival from waiting time using logistic regression')
 @st.cache_data
 def load_arrests():
     ts_cols = ['t0', 't1', 't1confirmed', 't2', 't3', 't4', 't5', 't6', 't7', 't9']
-    arrests = pd.read_csv(INFORMATION_PATH / 'arrests.csv', parse_dates=ts_cols, date_format='ISO8601')
+    # Parquet keeps the timestamp types, only the legacy CSV file needs date parsing
+    arrests = read_table(INFORMATION_PATH, 'arrests', parse_dates=ts_cols, date_format='ISO8601')
     return arrests
 
 def logistic_regression():
@@ -84,7 +86,7 @@ def logistic_regression():
     # Calculate actual survival percentage for each group of (rounded) waiting time & control
     arrests_plotted = arrests_filtered.copy()
     arrests_plotted['waiting_time_combined'] = arrests_plotted['waiting_time_combined'].round()
-    survival_percentages = arrests_plotted.groupby(['waiting_time_combined', control], as_index=False)['survived'].agg(['count', 'mean', 'sum'])
+    survival_percentages = arrests_plotted.groupby(['waiting_time_combined', control], as_index=False, observed=True)['survived'].agg(['count', 'mean', 'sum'])
     survival_percentages = survival_percentages.rename(columns={'count': 'count', 'mean': 'actual_percentage', 'sum': 'survived'})
     survival_percentages['actual_percentage_std'] = np.sqrt(survival_percentages['actual_percentage'] * (1-survival_percentages['actual_percentage']) / survival_percentages['count']) * 100
     survival_percentages['actual_percentage'] = survival_percentages['actual_percentage'] * 100
@@ -98,7 +100,7 @@ def logistic_regression():
     # Plot all categories in the same chart, with different colors
 
     fig2 = go.Figure()
-    top_categories = survival_percentages.groupby(control)['count'].sum().sort_values(ascending=False).index[:n_top_categories]
+    top_categories = survival_percentages.groupby(control, observed=True)['count'].sum().sort_values(ascending=False).index[:n_top_categories]
     top_arrests_plotted = arrests_plotted[arrests_plotted[control].isin(top_categories)]
     top_survival_percentages = survival_percentages[survival_percentages[control].isin(top_categories)]
     
@@ -154,7 +156,7 @@ def logistic_regression():
     with col6:
         # Plot horizontal bar chart of total number of arrests per control category using top_survival_percentages dataframe
         fig6 = go.Figure()
-        top_arrests = top_survival_percentages.groupby(control)['count'].sum().sort_values()
+        top_arrests = top_survival_percentages.groupby(control, observed=True)['count'].sum().sort_values()
         fig6.add_trace(go.Bar(
             x=top_arrests,
             y=top_arrests.index.astype(str),
@@ -175,11 +177,11 @@ def logistic_regression():
         # Plot horizontal bar chart of average waiting time per control category using top_survival_percentages dataframe
         fig7 = go.Figure()
         fig7.add_trace(go.Bar(
-            x=top_arrests_plotted.groupby(control)['waiting_time_combined'].mean()[top_arrests.index],
+            x=top_arrests_plotted.groupby(control, observed=True)['waiting_time_combined'].mean()[top_arrests.index],
             y=top_arrests.index.astype(str),
             orientation='h',
             marker=dict(color='RoyalBlue'),            
-            text=top_arrests_plotted.groupby(control)['waiting_time_combined'].mean()[top_arrests.index].round(2).astype(str),
+            text=top_arrests_plotted.groupby(control, observed=True)['waiting_time_combined'].mean()[top_arrests.index].round(2).astype(str),
             textposition='outside'
         ))
         fig7.update_layout(
@@ -194,11 +196,11 @@ def logistic_regression():
         # PLot horizontal bar chart of average survival percentage per control category using top_survival_percentages dataframe
         fig8 = go.Figure()
         fig8.add_trace(go.Bar(
-            x=(top_arrests_plotted.groupby(control)['survived'].mean() * 100)[top_arrests.index],
+            x=(top_arrests_plotted.groupby(control, observed=True)['survived'].mean() * 100)[top_arrests.index],
             y=top_arrests.index.astype(str),
             orientation='h',
             marker=dict(color='MediumSeaGreen'),
-            text=(top_arrests_plotted.groupby(control)['survived'].mean() * 100)[top_arrests.index].round(2).astype(str) + '%',
+            text=(top_arrests_plotted.groupby(control, observed=True)['survived'].mean() * 100)[top_arrests.index].round(2).astype(str) + '%',
             textposition='outside'
         ))
         fig8.update_layout(
@@ -1,45 +1,56 @@
+import argparse
+
 import pandas as pd
-import googlemaps
+from scripts.geocoding import Geocoder
 from scripts.paths import COMPARE_PATH
-
-
-# Replace 'YOUR_API_KEY' with your actual API key
-gmaps = googlemaps.Client(key='your_googlemap_api')
-
-def get_province(row):
-    # Perform reverse geocoding
-    result = gmaps.reverse_geocode((row['potential_aed_lat'], row['potential_aed_lon']))
-    
-    # Extract province from the result
-    for component in result[0]['address_components']:
-        if 'administrative_area_level_1' in component['types']:
-            province = component['long_name']
-            return province
-
-    return "Province Not Found"
-
-def add_province_to_comparisons():
-    cluster = pd.read_csv(COMPARE_PATH / 'new_aeds_grid__old_aeds.csv')
-    grid = pd.read_csv(COMPARE_PATH / 'new_aeds_cluster__old_aeds')
-
-    cluster['Province'] = cluster.apply(get_province, axis=1)
-    grid['Province'] = grid.apply(get_province, axis=1)
-
-    # Define the replacements
-    replacements = {
-        "Vlaams Gewest": "Flanders",
-        "Région Wallonne": "Wallonia",
-        "Waals Gewest": "Wallonia",
-        "Bruxelles": "Brussels"
-    }
-
-    # Apply the replacements to the "Province" column
-    cluster['Province'] = cluster['Province'].replace(replacements)
-    grid['Province'] = grid['Province'].replace(replacements)
-
-    # Save the modified datasets back to CSV files (if needed)
-    cluster.to_csv(COMPARE_PATH / 'new_aeds_grid__old_aeds__with_province.csv', index=False)
-    grid.to_csv(COMPARE_PATH / 'new_aeds_cluster__old_aeds__with_province.csv', index=False)
+from scripts.regions import assign_regions
+from scripts.storage import read_table, table_path, write_table
+
+
+def get_regions(comparison):
+    # Look up the region of all potential AEDs in the local grid of Belgium, without any network request
+    regions = assign_regions(comparison['potential_aed_lat'], comparison['potential_aed_lon'])
+    return [region or "Province Not Found" for region in regions]
+
+def get_provinces(comparison, geocoder):
+    # Reverse geocode all potential AEDs at once, locations looked up before are read from the cache
+    locations = list(zip(comparison['potential_aed_lat'], comparison['potential_aed_lon']))
+    return [province or "Province Not Found" for province in geocoder.reverse_geocode_many(locations)]
+
+# Define the replacements
+REPLACEMENTS = {
+    "Vlaams Gewest": "Flanders",
+    "Région Wallonne": "Wallonia",
+    "Waals Gewest": "Wallonia",
+    "Bruxelles": "Brussels"
+}
+
+def add_province_to_comparison(name, geocoder=None):
+    comparison = read_table(COMPARE_PATH, name)
+
+    if geocoder is not None:
+        # Apply the replacements to the "Province" column
+        comparison['Province'] = pd.Series(get_provinces(comparison, geocoder), index=comparison.index).replace(REPLACEMENTS)
+    else:
+        comparison['Province'] = get_regions(comparison)
+
+    # Save the modified dataset
+    write_table(comparison, COMPARE_PATH, f'{name}__with_province')
+
+    # Label the long layout summary as well, if it was written
+    if table_path(COMPARE_PATH, f'{name}__summary').exists():
+        summary = read_table(COMPARE_PATH, f'{name}__summary')
+        summary['Province'] = summary['potential_aed_id'].map(comparison.set_index('potential_aed_id')['Province'])
+        write_table(summary, COMPARE_PATH, f'{name}__summary__with_province')
+
+def add_province_to_comparisons(geocode=False):
+    geocoder = Geocoder() if geocode else None
+    for name in ['new_aeds_grid__old_aeds', 'new_aeds_cluster__old_aeds']:
+        add_province_to_comparison(name, geocoder)
 
 if __name__ == '__main__':
-    add_province_to_comparisons()
+    parser = argparse.ArgumentParser(description='Add the region of every potential AED to the comparisons')
+    parser.add_argument('--geocode', action='store_true', help='reverse geocode through the geocoding service instead of the local grid')
+    args = parser.parse_args()
+
+    add_province_to_comparisons(geocode=args.geocode)
@@ -0,0 +1,66 @@
+import argparse
+import os
+from collections import namedtuple
+from pathlib import Path
+
+import joblib
+import numpy as np
+from scripts.cache import artifact_key
+from scripts.paths import INDEX_PATH, LOCATION_PATH
+from scripts.spatial_index import build_tree, query_nearest
+from scripts.storage import read_table, resolve_table
+
+# Ball tree of all AEDs in a set, the first AED at the location of every AED (to resolve duplicate locations
+# like np.argmin would) and the AED coordinates as float32 for display
+AedIndex = namedtuple('AedIndex', ['tree', 'first_index', 'locations'])
+
+
+def index_path(aed_csv):
+    # Index files are named after the content of the AED locations, so a file is never overwritten
+    # while another process has it memory mapped
+    name = Path(aed_csv).name.removesuffix('.csv').removesuffix('.parquet')
+    key = artifact_key('aed_index', [resolve_table(LOCATION_PATH, aed_csv), __file__])
+    return INDEX_PATH / f'{name}-{key[:16]}.joblib'
+
+
+def build_aed_index(aed_csv):
+    path = index_path(aed_csv)
+    if path.exists():
+        return path
+
+    print(f'Building the AED index of {aed_csv}')
+    locations = read_table(LOCATION_PATH, aed_csv, columns=['lat', 'lon']).values
+    _, first_index, inverse = np.unique(locations, axis=0, return_index=True, return_inverse=True)
+    index = {'tree': build_tree(locations), 'first_index': first_index[inverse.ravel()], 'locations': locations.astype(np.float32)}
+
+    INDEX_PATH.mkdir(parents=True, exist_ok=True)
+    partial_path = path.with_name(path.name + '.partial')
+    joblib.dump(index, partial_path)
+    os.replace(partial_path, path)
+
+    # Remove indexes of older versions of the AED set, processes still mapping them keep their copy
+    name = path.name.rsplit('-', 1)[0]
+    for old_path in INDEX_PATH.glob(f'{name}-*.joblib'):
+        if old_path != path and old_path.name.rsplit('-', 1)[0] == name:
+            old_path.unlink(missing_ok=True)
+    return path
+
+
+def load_aed_index(aed_csv):
+    # Memory map the arrays of the index (zero-copy), so processes using it share the OS page cache
+    return AedIndex(**joblib.load(build_aed_index(aed_csv), mmap_mode='r'))
+
+
+def nearest_aeds(index, locations):
+    # Index of, and distance (in km) to, the closest AED of every location, like nearest_locations
+    indices, distances = query_nearest(index.tree, locations)
+    return index.first_index[indices], distances
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the nearest-neighbour index of AED sets')
+    parser.add_argument('aed_csvs', nargs='*', default=['old_aeds.csv'], help='AED locations files in transformed_data/location')
+    args = parser.parse_args()
+
+    for aed_csv in args.aed_csvs:
+        print(build_aed_index(aed_csv))
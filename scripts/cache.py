@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+from scripts.paths import CACHE_PATH
+
+# Size bound of the artifact cache, least recently used artifacts are evicted beyond it
+MAX_CACHE_BYTES = int(float(os.environ.get('AED_CACHE_MAX_MB', 2048)) * 1024 ** 2)
+
+# File hashes by (path, size, modification time), so unchanged inputs are hashed once per process
+_file_hashes = {}
+
+
+def hash_file(path):
+    path = Path(path)
+    stat = path.stat()
+    memo_key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _file_hashes:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 ** 2), b''):
+                digest.update(block)
+        _file_hashes[memo_key] = digest.hexdigest()
+    return _file_hashes[memo_key]
+
+
+def artifact_key(step, inputs=(), params=None, data=()):
+    # Key an artifact on the step producing it, the content of its input files, its parameters and any in-memory data
+    digest = hashlib.sha256(step.encode())
+    for path in inputs:
+        digest.update(hash_file(path).encode())
+    digest.update(json.dumps(params or {}, sort_keys=True, default=str).encode())
+    for array in data:
+        digest.update(memoryview(array).cast('B'))
+    return digest.hexdigest()
+
+
+def evict(max_bytes=MAX_CACHE_BYTES):
+    # Remove least recently used artifacts until the cache fits in max_bytes
+    entries = sorted((entry.stat().st_mtime, entry.stat().st_size, entry) for entry in CACHE_PATH.glob('*') if entry.is_file())
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, entry in entries:
+        if total_bytes <= max_bytes:
+            break
+        entry.unlink(missing_ok=True)
+        total_bytes -= size
+
+
+def cached_artifact(step, output_path, inputs, build, params=None):
+    # Restore output_path from the cache if an artifact with the same key exists, otherwise build and store it.
+    # Returns whether the artifact was served from the cache.
+    output_path = Path(output_path)
+    entry = CACHE_PATH / f'{artifact_key(step, inputs, params)}{output_path.suffix}'
+
+    if entry.exists():
+        os.utime(entry)
+        shutil.copyfile(entry, output_path)
+        return True
+
+    build()
+    store_artifact(step, output_path, inputs, params)
+    return False
+
+
+def store_artifact(step, output_path, inputs, params=None):
+    # Store output_path as the artifact of its inputs, e.g. after updating an artifact of older inputs in place
+    output_path = Path(output_path)
+    entry = CACHE_PATH / f'{artifact_key(step, inputs, params)}{output_path.suffix}'
+    CACHE_PATH.mkdir(parents=True, exist_ok=True)
+    partial_entry = entry.with_name(entry.name + '.partial')
+    shutil.copyfile(output_path, partial_entry)
+    os.replace(partial_entry, entry)
+    evict()
+
+
+def cached_array(step, build, params=None, data=()):
+    # Like cached_artifact, for an array computed in memory from in-memory data
+    entry = CACHE_PATH / f'{artifact_key(step, params=params, data=data)}.npy'
+    if entry.exists():
+        os.utime(entry)
+        return np.load(entry)
+
+    array = build()
+    CACHE_PATH.mkdir(parents=True, exist_ok=True)
+    partial_entry = entry.with_name(entry.name + '.partial')
+    with open(partial_entry, 'wb') as f:
+        np.save(f, array)
+    os.replace(partial_entry, entry)
+    evict()
+    return array
@@ -1,33 +1,109 @@
-import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 
 import pandas as pd
-import sys
 import numpy as np
+from scripts.cache import cached_artifact, store_artifact
 from scripts.paths import LOCATION_PATH, DISTANCE_PATH
+from scripts.storage import read_table, resolve_table, table_path, write_table
+from scripts.aed_index import load_aed_index, nearest_aeds
+from scripts.spatial_index import EARTH_RADIUS_KM
 
 
 from sklearn.metrics.pairwise import haversine_distances
 
+# AED locations (in radians) shared by the chunk workers, set once per worker process
+_worker_aed_radians = None
+
 def calculate_distances(arrest_locations, aed_locations):
-    return haversine_distances(np.radians(arrest_locations), np.radians(aed_locations)) * 6371000/1000
+    return haversine_distances(np.radians(arrest_locations), np.radians(aed_locations)) * EARTH_RADIUS_KM
+
+def chunk_size_for_memory(max_memory_mb, aed_count, workers=1):
+    # Each worker holds a float64 distance block plus the temporaries haversine_distances allocates
+    bytes_per_arrest = aed_count * 8 * 4
+    return max(1, int(max_memory_mb * 1024 ** 2 // (bytes_per_arrest * workers)))
+
+def _init_worker(aed_radians):
+    global _worker_aed_radians
+    _worker_aed_radians = aed_radians
+
+def _nearest_in_chunk(arrest_locations):
+    # Reduce the block to (argmin, min) right away so the full matrix is never held
+    distances = haversine_distances(np.radians(arrest_locations), _worker_aed_radians)
+    indices = np.argmin(distances, axis=1)
+    return indices, distances[np.arange(len(indices)), indices] * EARTH_RADIUS_KM
+
+def calculate_distances_chunked(arrest_locations, aed_locations, chunk_size, workers=1):
+    aed_radians = np.radians(aed_locations)
+    chunks = [arrest_locations[start:start + chunk_size] for start in range(0, len(arrest_locations), chunk_size)]
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(aed_radians,)) as executor:
+            results = list(executor.map(_nearest_in_chunk, chunks))
+    else:
+        _init_worker(aed_radians)
+        results = [_nearest_in_chunk(chunk) for chunk in chunks]
+
+    indices = np.concatenate([chunk_indices for chunk_indices, _ in results])
+    distances = np.concatenate([chunk_distances for _, chunk_distances in results])
+    return indices, distances
+
+def vital_distance_inputs(aed_csv):
+    return [resolve_table(LOCATION_PATH, 'arrests.csv'), resolve_table(LOCATION_PATH, aed_csv), __file__]
 
-def calculate_vital_distances(aed_csv='old_aeds.csv'):
-    arrest_locations = pd.read_csv(LOCATION_PATH / 'arrests.csv').values
-    aed_locations = pd.read_csv(LOCATION_PATH / aed_csv).values
+def calculate_vital_distances(aed_csv='old_aeds.csv', chunk_size=None, workers=1, max_memory_mb=None):
+    # The ball tree and the chunked computation give identical results, so they share cached artifacts
+    inputs = vital_distance_inputs(aed_csv)
+    if cached_artifact('vital_distances', table_path(DISTANCE_PATH, aed_csv), inputs, lambda: _calculate_vital_distances(aed_csv, chunk_size, workers, max_memory_mb)):
+        print(f'Using cached vital distances of {aed_csv}')
+
+def append_vital_distances(aed_csv, start):
+    # Only calculate the vital distances of arrests appended from position start on,
+    # the stored distances must be the ones of the arrests before
+    vital_distances = read_table(DISTANCE_PATH, aed_csv)
+    if len(vital_distances) != start:
+        raise ValueError(f'Vital distances of {aed_csv} are not the ones of the first {start} arrests')
+    arrest_locations = read_table(LOCATION_PATH, 'arrests.csv', columns=['lat', 'lon']).values[start:]
+    aed_index = load_aed_index(aed_csv)
+
+    print(f'Calculating vital distances between {len(arrest_locations)} new arrests and {len(aed_index.locations)} AED in {aed_csv}')
+    indices, distances = nearest_aeds(aed_index, arrest_locations)
+    vital_distances = pd.concat([vital_distances, pd.DataFrame({'index': indices, 'distance': distances})], ignore_index=True)
+    write_table(vital_distances, DISTANCE_PATH, aed_csv)
+    store_artifact('vital_distances', table_path(DISTANCE_PATH, aed_csv), vital_distance_inputs(aed_csv))
+
+def _calculate_vital_distances(aed_csv, chunk_size, workers, max_memory_mb):
+    arrest_locations = read_table(LOCATION_PATH, 'arrests.csv', columns=['lat', 'lon']).values
+    aed_locations = read_table(LOCATION_PATH, aed_csv, columns=['lat', 'lon']).values
 
     print(f'Calculating vital distances between {len(arrest_locations)} arrests and {len(aed_locations)} AED in {aed_csv}')
-    distances = calculate_distances(arrest_locations, aed_locations)
+    if max_memory_mb is not None:
+        chunk_size = min(chunk_size or len(arrest_locations), chunk_size_for_memory(max_memory_mb, len(aed_locations), workers))
+
+    if chunk_size is not None:
+        # Stream arrests through the exact distance computation in blocks, optionally across processes
+        print(f'Using chunks of {chunk_size} arrests on {workers} worker(s)')
+        indices, distances = calculate_distances_chunked(arrest_locations, aed_locations, chunk_size, workers)
+    else:
+        # Query the ball tree of the AEDs instead of computing the full arrest x AED distance matrix
+        indices, distances = nearest_aeds(load_aed_index(aed_csv), arrest_locations)
 
     # Calculate vital distance for each arrest
-    vital_distances = pd.DataFrame({'index': np.argmin(distances, axis=1), 'distance': np.min(distances, axis=1)})
+    vital_distances = pd.DataFrame({'index': indices, 'distance': distances})
 
     # Save distances
-    vital_distances.to_csv(DISTANCE_PATH / aed_csv, index=False)
+    write_table(vital_distances, DISTANCE_PATH, aed_csv)
 
 if __name__ == '__main__':
-    if len(sys.argv) > 1:
-        print('Calculating vital distances of', sys.argv[1])
-        calculate_vital_distances(sys.argv[1])
-    else:
-        print('No AED locations file provided, using old_aeds.csv')
-        calculate_vital_distances('old_aeds.csv')
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Calculate the distance from every arrest to its closest AED')
+    parser.add_argument('aed_csv', nargs='?', default='old_aeds.csv', help='AED locations file in transformed_data/location')
+    parser.add_argument('--chunk-size', type=int, help='number of arrests per block in streaming mode')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes in streaming mode')
+    parser.add_argument('--max-memory-mb', type=float, help='memory ceiling per run in streaming mode, caps the chunk size')
+    args = parser.parse_args()
+
+    if args.workers > 1 and args.chunk_size is None and args.max_memory_mb is None:
+        parser.error('--workers requires --chunk-size or --max-memory-mb')
+
+    print('Calculating vital distances of', args.aed_csv)
+    calculate_vital_distances(args.aed_csv, chunk_size=args.chunk_size, workers=args.workers, max_memory_mb=args.max_memory_mb)
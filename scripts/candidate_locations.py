@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+KM_PER_DEGREE = 111.32
+
+
+def _points_around(centers, radius, rng):
+    # Uniform points within radius (in km) of every center, divide by 111.32 (times cos(lat) for longitudes) to convert km to degrees
+    r = radius * np.sqrt(rng.random(len(centers)))
+    angle = 2 * np.pi * rng.random(len(centers))
+    lat = centers[:, 0] + r * np.cos(angle) / KM_PER_DEGREE
+    lon = centers[:, 1] + r * np.sin(angle) / (KM_PER_DEGREE * np.cos(np.radians(centers[:, 0])))
+    return lat, lon
+
+
+def generate_candidate_locations(centers, radius, num_points, rng=None, within_belgium=False, max_attempts=20):
+    # Draw num_points candidate locations around every center of gravity at once.
+    # rng is a seed or a numpy Generator, so the candidates can be reproduced.
+    rng = np.random.default_rng(rng)
+    point_centers = np.repeat(np.asarray(centers, dtype=float), num_points, axis=0)
+    lat, lon = _points_around(point_centers, radius, rng)
+
+    if within_belgium:
+        from scripts.regions import in_belgium
+
+        # Redraw the points that fell outside the land boundary of Belgium (abroad or at sea), and drop the ones
+        # still outside after max_attempts, e.g. all points around a center across the border
+        outside = ~in_belgium(lat, lon)
+        for _ in range(max_attempts):
+            if not outside.any():
+                break
+            lat[outside], lon[outside] = _points_around(point_centers[outside], radius, rng)
+            outside[outside] = ~in_belgium(lat[outside], lon[outside])
+        lat, lon = lat[~outside], lon[~outside]
+
+    return pd.DataFrame({'lat': lat, 'lon': lon})
@@ -0,0 +1,34 @@
+import numpy as np
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from scripts.cache import cached_array
+from scripts.regions import project, unproject
+
+
+def aggregate_duplicates(locations):
+    # Many arrests share coordinates, cluster every distinct location once, weighted by its count
+    unique_locations, counts = np.unique(locations, axis=0, return_counts=True)
+    return unique_locations, counts
+
+
+def get_centers_of_gravity(df, N, seed=0, mini_batch=True, aggregate=True, batch_size=4096):
+    # Cluster the (lat, lon) locations in metres (ETRS89-LAEA) and return the N centers as (lat, lon).
+    # Fitted centers are cached per (data, N, seed, options), so re-runs return instantly.
+    locations = np.ascontiguousarray(df[['lat', 'lon']].to_numpy(dtype=float))
+    params = {'N': N, 'seed': seed, 'mini_batch': mini_batch, 'aggregate': aggregate, 'batch_size': batch_size}
+    return cached_array('centers_of_gravity', lambda: _fit_centers(locations, N, seed, mini_batch, aggregate, batch_size), params=params, data=[locations])
+
+
+def _fit_centers(locations, N, seed, mini_batch, aggregate, batch_size):
+    if aggregate:
+        locations, weights = aggregate_duplicates(locations)
+    else:
+        weights = None
+    points = np.column_stack(project(locations[:, 0], locations[:, 1]))
+
+    if mini_batch:
+        kmeans = MiniBatchKMeans(n_clusters=N, random_state=seed, batch_size=batch_size, n_init=3)
+    else:
+        kmeans = KMeans(n_clusters=N, random_state=seed)
+    kmeans.fit(points, sample_weight=weights)
+
+    return np.column_stack(unproject(kmeans.cluster_centers_[:, 0], kmeans.cluster_centers_[:, 1]))
@@ -1,28 +1,118 @@
+import argparse
+import ast
+
 import pandas as pd
-import sys
 import numpy as np
 from scripts.paths import LOCATION_PATH, DISTANCE_PATH, DISTANCE_PATH, COMPARE_PATH
+from scripts.aed_index import load_aed_index
+from scripts.cache import cached_artifact, store_artifact
 from scripts.calculate_vital_distances import calculate_vital_distances
+from scripts.coverage import coverage_counts, within_radius
+from scripts.storage import read_table, resolve_table, table_path, write_table
+
+# Columns holding one value per (potential AED, arrest) pair
+PAIR_COLUMNS = [
+    'distance_to_potential_aed', 'intervention_id', 'intervention_lat', 'intervention_lon',
+    'existing_aed_id', 'distance_to_existing_aed', 'existing_aed_lat', 'existing_aed_lon'
+]
 
 def nest_list(group):
     return group.tolist()
 
-def compare_vital_distances(new_aed_csv, old_aed_csv='old_aeds.csv'):
+def concat_lists(group):
+    return np.concatenate([np.asarray(values) for values in group]).tolist()
+
+def read_comparison(name):
+    # Read a comparison with list columns, parsing the stringified lists of legacy CSV files
+    comparison = read_table(COMPARE_PATH, name)
+    for col in PAIR_COLUMNS:
+        if comparison[col].map(type).eq(str).any():
+            comparison[col] = comparison[col].apply(ast.literal_eval)
+    return comparison
+
+def long_layout(comparison):
+    # Split a comparison into one row per potential AED, with the offset and length of its arrests,
+    # and one row per (potential AED, arrest) pair, grouped by potential AED in the same order
+    comparison = comparison.reset_index(drop=True)
+    lengths = comparison['intervention_id'].apply(len).to_numpy()
+
+    summary = comparison.drop(columns=PAIR_COLUMNS)
+    summary['offset'] = np.cumsum(lengths) - lengths
+    summary['length'] = lengths
+
+    pairs = pd.DataFrame({'potential_aed_id': np.repeat(comparison['potential_aed_id'].to_numpy(), lengths)})
+    for col in PAIR_COLUMNS:
+        pairs[col] = np.concatenate([np.asarray(values) for values in comparison[col]]) if len(comparison) else []
+    return summary, pairs
+
+def comparison_name(new_aed_csv, old_aed_csv):
+    new_aed_filename = new_aed_csv.split('.')[0] if '.csv' in new_aed_csv else new_aed_csv
+    return f'{new_aed_filename}__{old_aed_csv.split(".")[0]}'
+
+def comparison_inputs(new_aed_csv, old_aed_csv):
+    return [resolve_table(LOCATION_PATH, 'arrests.csv'), resolve_table(LOCATION_PATH, new_aed_csv), resolve_table(LOCATION_PATH, old_aed_csv),
+            table_path(DISTANCE_PATH, new_aed_csv), table_path(DISTANCE_PATH, old_aed_csv), __file__]
+
+def write_long_layout(new_aed_csv, old_aed_csv):
+    # Normalised layout, so consumers can slice a potential AED's arrests without parsing lists
+    name = comparison_name(new_aed_csv, old_aed_csv)
+    summary, pairs = long_layout(read_comparison(name))
+    write_table(summary, COMPARE_PATH, f'{name}__summary')
+    write_table(pairs, COMPARE_PATH, f'{name}__pairs')
+
+def compare_vital_distances(new_aed_csv, old_aed_csv='old_aeds.csv', radius_km=None, long=False):
+    # Get vital distances, these are reused from the cache as long as their inputs are unchanged
+    calculate_vital_distances(new_aed_csv)
+    calculate_vital_distances(old_aed_csv)
+
+    output_path = table_path(COMPARE_PATH, comparison_name(new_aed_csv, old_aed_csv))
+    if cached_artifact('compare_vital_distances', output_path, comparison_inputs(new_aed_csv, old_aed_csv),
+                       lambda: _compare_vital_distances(new_aed_csv, old_aed_csv, radius_km), params={'radius_km': radius_km}):
+        print(f'Using cached comparison of {new_aed_csv} and {old_aed_csv}')
+
+    if long:
+        write_long_layout(new_aed_csv, old_aed_csv)
+
+def update_comparison(new_aed_csv, old_aed_csv, start, radius_km=None):
+    # Add the arrests appended from position start on to the comparison of the arrests before,
+    # only rows of potential AEDs closer to one of the new arrests change
+    name = comparison_name(new_aed_csv, old_aed_csv)
+    comparison = read_comparison(name)
+    if 'newly_covered_count' in comparison and radius_km is None:
+        raise ValueError(f'{name} counts newly covered arrests, pass the radius it was compared with')
+    added = _closer_new_aeds(new_aed_csv, old_aed_csv, radius_km, start)
+    print(f'Adding {len(added)} potential AEDs closer to new arrests to {name}')
+
+    changed = comparison['potential_aed_id'].isin(added['potential_aed_id'])
+    aggregations = {'newly_covered_count': ('newly_covered_count', 'sum')} if radius_km is not None else {}
+    updated = pd.concat([comparison[changed], added], ignore_index=True).groupby('potential_aed_id', as_index=False).agg(
+        arrest_count=('arrest_count', 'sum'),
+        potential_aed_lat=('potential_aed_lat', 'max'),
+        potential_aed_lon=('potential_aed_lon', 'max'),
+        **{col: (col, concat_lists) for col in PAIR_COLUMNS},
+        **aggregations)
+    comparison = pd.concat([comparison[~changed], updated[comparison.columns]], ignore_index=True).sort_values(by='arrest_count', ascending=False)
+
+    write_table(comparison, COMPARE_PATH, name)
+    store_artifact('compare_vital_distances', table_path(COMPARE_PATH, name), comparison_inputs(new_aed_csv, old_aed_csv), params={'radius_km': radius_km})
+    if table_path(COMPARE_PATH, f'{name}__summary').exists():
+        write_long_layout(new_aed_csv, old_aed_csv)
+
+def _compare_vital_distances(new_aed_csv, old_aed_csv, radius_km):
     print(f'Comparing vital distances between {new_aed_csv} and {old_aed_csv}')
-    # Get vital distances & locations
-    if not (DISTANCE_PATH / new_aed_csv).exists():
-        calculate_vital_distances(new_aed_csv)
-    if not (DISTANCE_PATH / old_aed_csv).exists():
-        calculate_vital_distances(old_aed_csv)
-
-    new_distances = pd.read_csv(DISTANCE_PATH / new_aed_csv)
-    old_distances = pd.read_csv(DISTANCE_PATH / old_aed_csv)
-    new_locations = pd.read_csv(LOCATION_PATH / new_aed_csv)
-    old_locations = pd.read_csv(LOCATION_PATH / old_aed_csv)
-    arrest_locations = pd.read_csv(LOCATION_PATH / 'arrests.csv')
+    write_table(_closer_new_aeds(new_aed_csv, old_aed_csv, radius_km), COMPARE_PATH, comparison_name(new_aed_csv, old_aed_csv))
+
+def _closer_new_aeds(new_aed_csv, old_aed_csv, radius_km, start=0):
+    return closer_new_aeds(
+        read_table(DISTANCE_PATH, new_aed_csv), read_table(DISTANCE_PATH, old_aed_csv),
+        read_table(LOCATION_PATH, new_aed_csv, columns=['lat', 'lon']), read_table(LOCATION_PATH, old_aed_csv, columns=['lat', 'lon']),
+        read_table(LOCATION_PATH, 'arrests.csv', columns=['lat', 'lon']), radius_km, start,
+        old_tree=load_aed_index(old_aed_csv).tree if radius_km is not None else None)
 
+def closer_new_aeds(new_distances, old_distances, new_locations, old_locations, arrest_locations, radius_km=None, start=0, old_tree=None):
+    # Group the arrests from position start on by the new AED closer to them than any old AED
     # Get arrests with closer new AEDs
-    arrest_with_closer_new_aeds = new_distances.loc[new_distances['distance'] < old_distances['distance']]
+    arrest_with_closer_new_aeds = new_distances.loc[(new_distances['distance'] < old_distances['distance']) & (new_distances.index >= start)]
     arrest_with_closer_new_aeds = arrest_with_closer_new_aeds.reset_index()
     arrest_with_closer_new_aeds.columns = ['arrest', 'new_aed', 'new_distance']
 
@@ -32,6 +122,13 @@ def compare_vital_distances(new_aed_csv, old_aed_csv='old_aeds.csv'):
     arrest_with_closer_new_aeds = pd.merge(arrest_with_closer_new_aeds, new_locations, left_on='new_aed', right_index=True).rename(columns={'lat': 'new_lat', 'lon': 'new_lon'})
     arrest_with_closer_new_aeds = pd.merge(arrest_with_closer_new_aeds, old_locations, left_on='old_aed', right_index=True).rename(columns={'lat': 'old_lat', 'lon': 'old_lon'})
 
+    aggregations = {}
+    if radius_km is not None:
+        # Count arrests that have no old AED within the radius but do get the new AED within it
+        old_aed_counts = coverage_counts(within_radius(arrest_locations.values[start:], old_locations.values, radius_km, tree=old_tree))
+        arrest_with_closer_new_aeds['newly_covered'] = (old_aed_counts[arrest_with_closer_new_aeds['arrest'].values - start] == 0) & (arrest_with_closer_new_aeds['new_distance'] <= radius_km)
+        aggregations['newly_covered_count'] = ('newly_covered', 'sum')
+
     # Group by new AED
     closer_new_aeds = arrest_with_closer_new_aeds.groupby('new_aed', as_index=False).agg(
         arrest_count=('arrest', 'nunique'),
@@ -44,7 +141,8 @@ def compare_vital_distances(new_aed_csv, old_aed_csv='old_aeds.csv'):
         old_aed=('old_aed', nest_list),
         old_distance=('old_distance', nest_list),
         old_lat=('old_lat', nest_list),
-        old_lon=('old_lon', nest_list)).sort_values(by='arrest_count', ascending=False)
+        old_lon=('old_lon', nest_list),
+        **aggregations).sort_values(by='arrest_count', ascending=False)
 
     closer_new_aeds.rename({
         'new_aed': 'potential_aed_id',
@@ -59,14 +157,15 @@ def compare_vital_distances(new_aed_csv, old_aed_csv='old_aeds.csv'):
         'old_lat': 'existing_aed_lat',
         'old_lon': 'existing_aed_lon'
     }, axis=1, inplace=True)
+    return closer_new_aeds
 
-    new_aed_filename = new_aed_csv.split('.')[0] if '.csv' in new_aed_csv else new_aed_csv
-    closer_new_aeds.to_csv(COMPARE_PATH / f'{new_aed_filename}__{old_aed_csv}', index=False)
-        
 if __name__ == '__main__':
-    if len(sys.argv) > 2:
-        print('Comparing vital distances of', sys.argv[1], 'with', sys.argv[2])
-        compare_vital_distances(sys.argv[1], sys.argv[2])
-    else:
-        print('No old AED file provided, using old_aeds.csv')
-        compare_vital_distances(sys.argv[1], 'old_aeds.csv')
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Compare the vital distances of new AED locations with old ones')
+    parser.add_argument('new_aed_csv', help='new AED locations file in transformed_data/location')
+    parser.add_argument('old_aed_csv', nargs='?', default='old_aeds.csv', help='old AED locations file in transformed_data/location')
+    parser.add_argument('--radius-km', type=float, help='also count arrests newly covered within this radius')
+    parser.add_argument('--long', action='store_true', help='also write one row per (potential AED, arrest) pair with per-AED offsets')
+    args = parser.parse_args()
+
+    print('Comparing vital distances of', args.new_aed_csv, 'with', args.old_aed_csv)
+    compare_vital_distances(args.new_aed_csv, args.old_aed_csv, radius_km=args.radius_km, long=args.long)
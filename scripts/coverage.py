@@ -0,0 +1,63 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from scripts.spatial_index import EARTH_RADIUS_KM, build_tree
+
+# CSR-style result: the AEDs of arrest i are indices[indptr[i]:indptr[i + 1]], sorted by distance (in km)
+Coverage = namedtuple('Coverage', ['indptr', 'indices', 'distances'])
+
+
+def _batches(locations, batch_size):
+    for start in range(0, len(locations), batch_size):
+        yield np.radians(locations[start:start + batch_size])
+
+
+def k_nearest(arrests, aeds, k, batch_size=10000, tree=None):
+    # Get the k closest AEDs of every arrest, tree is an optional prebuilt tree of the AEDs (e.g. of an AedIndex)
+    arrests = np.asarray(arrests, dtype=float)
+    k = min(k, len(aeds))
+    tree = build_tree(aeds) if tree is None else tree
+
+    indices, distances = [], []
+    for batch in _batches(arrests, batch_size):
+        batch_distances, batch_indices = tree.query(batch, k=k)
+        indices.append(batch_indices.ravel())
+        distances.append(batch_distances.ravel() * EARTH_RADIUS_KM)
+
+    indptr = np.arange(len(arrests) + 1, dtype=np.int64) * k
+    return Coverage(indptr, np.concatenate(indices).astype(np.int64), np.concatenate(distances))
+
+
+def within_radius(arrests, aeds, r_km, batch_size=10000, tree=None):
+    # Get all AEDs within r_km of every arrest, r_km is either one radius or a radius per arrest
+    arrests = np.asarray(arrests, dtype=float)
+    radii = np.broadcast_to(np.asarray(r_km, dtype=float) / EARTH_RADIUS_KM, len(arrests)).copy()
+    tree = build_tree(aeds) if tree is None else tree
+
+    counts, indices, distances = [], [], []
+    for start, batch in zip(range(0, len(arrests), batch_size), _batches(arrests, batch_size)):
+        batch_radii = radii[start:start + batch_size]
+        batch_indices, batch_distances = tree.query_radius(batch, r=batch_radii, return_distance=True, sort_results=True)
+        counts.append(np.fromiter((len(row) for row in batch_indices), dtype=np.int64, count=len(batch_indices)))
+        indices.extend(batch_indices)
+        distances.extend(batch_distances)
+
+    indptr = np.concatenate([[0], np.cumsum(np.concatenate(counts))]) if counts else np.zeros(1, dtype=np.int64)
+    if indices:
+        return Coverage(indptr, np.concatenate(indices).astype(np.int64), np.concatenate(distances) * EARTH_RADIUS_KM)
+    return Coverage(indptr, np.empty(0, dtype=np.int64), np.empty(0))
+
+
+def coverage_counts(coverage):
+    # Number of AEDs found for every arrest
+    return np.diff(coverage.indptr)
+
+
+def coverage_frame(coverage):
+    # One row per (arrest, AED) pair
+    return pd.DataFrame({
+        'arrest': np.repeat(np.arange(len(coverage.indptr) - 1), coverage_counts(coverage)),
+        'aed': coverage.indices,
+        'distance': coverage.distances
+    })
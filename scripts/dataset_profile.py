@@ -0,0 +1,149 @@
+import argparse
+import json
+import os
+from collections import namedtuple
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from scripts.cache import hash_file
+from scripts.paths import DATA_PATH
+
+# Number of most frequent values kept per column
+TOP_K = 10
+# Trigrams are only indexed for string columns with at most this many distinct values, beyond it (e.g. timestamps)
+# the index would outgrow the data while a scan of the distinct values is about as fast as a scan of the rows
+MAX_TRIGRAM_VALUES = 50000
+REGEX_CHARACTERS = set('.^$*+?{}[]\\|()')
+
+# Column statistics (from the JSON file) and the distinct-value index of every column (memory mapped):
+# per column the sorted distinct values, the code of every row (-1 for nulls) and, for string columns,
+# an inverted index from trigrams to the codes of the values containing them
+DatasetProfile = namedtuple('DatasetProfile', ['statistics', 'index'])
+
+
+def profile_paths(data_file):
+    # Stored next to the data file, e.g. data/interventions1.profile.json and data/interventions1.index.joblib
+    data_file = Path(data_file)
+    name = data_file.name.removesuffix('.gzip').removesuffix('.parquet')
+    return data_file.with_name(f'{name}.profile.json'), data_file.with_name(f'{name}.index.joblib')
+
+
+def as_strings(values):
+    # Values as the lowercase strings they are searched in
+    if not pa.types.is_string(values.type) and not pa.types.is_large_string(values.type):
+        values = pc.cast(values, pa.string())
+    return pc.utf8_lower(values)
+
+
+def value_trigrams(value):
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+def trigram_index(strings):
+    # Sorted trigrams, and for every trigram the codes of the values containing it (CSR layout)
+    pairs = sorted((trigram, code) for code, value in enumerate(strings) if value is not None for trigram in value_trigrams(value))
+    trigrams = np.array([trigram for trigram, _ in pairs], dtype='U3')
+    keys, starts = np.unique(trigrams, return_index=True)
+    return {
+        'trigrams': keys,
+        'trigram_offsets': np.append(starts, len(pairs)).astype(np.int64),
+        'trigram_codes': np.array([code for _, code in pairs], dtype=np.int32),
+    }
+
+
+def column_profile(column):
+    # Statistics and distinct-value index of one column
+    values = pc.unique(pc.drop_null(column))
+    values = values.take(pc.sort_indices(values))
+    codes = pc.fill_null(pc.index_in(column, value_set=values), -1).to_numpy(zero_copy_only=False).astype(np.int32)
+    counts = np.bincount(codes[codes >= 0], minlength=len(values))
+
+    top = np.argsort(-counts, kind='stable')[:TOP_K]
+    statistics = {
+        'type': str(column.type),
+        'count': len(column) - column.null_count,
+        'null_count': column.null_count,
+        'null_rate': column.null_count / len(column) if len(column) else 0.0,
+        'distinct_count': len(values),
+        'min': values[0].as_py() if len(values) else None,
+        'max': values[-1].as_py() if len(values) else None,
+        'top': [{'value': values[int(code)].as_py(), 'count': int(counts[code])} for code in top],
+    }
+    index = {'values': values, 'codes': codes}
+    if (pa.types.is_string(column.type) or pa.types.is_large_string(column.type)) and len(values) <= MAX_TRIGRAM_VALUES:
+        index.update(trigram_index(as_strings(values).to_pylist()))
+    return statistics, index
+
+
+def profile_dataset(data_file):
+    data_file = Path(data_file)
+    statistics_path, index_path = profile_paths(data_file)
+    table = pq.read_table(data_file)
+
+    print(f'Profiling {len(table.column_names)} columns of {table.num_rows} rows in {data_file}')
+    statistics, index = {}, {}
+    for name in table.column_names:
+        statistics[name], index[name] = column_profile(table.column(name).combine_chunks())
+
+    # The index is written first, a profile is only used when its statistics belong to the current data file
+    partial_path = index_path.with_name(index_path.name + '.partial')
+    joblib.dump(index, partial_path)
+    os.replace(partial_path, index_path)
+    with open(statistics_path, 'w') as f:
+        json.dump({'source_sha256': hash_file(data_file), 'num_rows': table.num_rows, 'columns': statistics}, f, indent=2, default=str)
+    return statistics_path, index_path
+
+
+def load_dataset_profile(data_file):
+    # Profile of the data file, or None if it was not profiled (or changed since)
+    statistics_path, index_path = profile_paths(data_file)
+    if not statistics_path.exists() or not index_path.exists():
+        return None
+    with open(statistics_path) as f:
+        statistics = json.load(f)
+    if statistics['source_sha256'] != hash_file(data_file):
+        return None
+    return DatasetProfile(statistics['columns'], joblib.load(index_path, mmap_mode='r'))
+
+
+def _trigram_candidates(column_index, term):
+    # Codes of the values containing every trigram of the term
+    candidates = None
+    for trigram in value_trigrams(term):
+        position = np.searchsorted(column_index['trigrams'], trigram)
+        if position == len(column_index['trigrams']) or column_index['trigrams'][position] != trigram:
+            return np.empty(0, dtype=np.int32)
+        offsets = column_index['trigram_offsets']
+        codes = column_index['trigram_codes'][offsets[position]:offsets[position + 1]]
+        candidates = codes if candidates is None else np.intersect1d(candidates, codes, assume_unique=True)
+    return candidates
+
+
+def matching_codes(column_index, pattern):
+    # Codes of the distinct values containing the (case-insensitive) regular expression pattern.
+    # Plain search terms of 3+ characters are first narrowed down with the trigram index.
+    values = column_index['values']
+    if 'trigrams' in column_index and len(pattern) >= 3 and not set(pattern) & REGEX_CHARACTERS:
+        codes = _trigram_candidates(column_index, pattern.lower())
+        matches = pc.match_substring(as_strings(values.take(pa.array(codes))), pattern.lower())
+        return codes[pc.fill_null(matches, False).to_numpy(zero_copy_only=False)]
+    matches = pc.match_substring_regex(as_strings(values), pattern, ignore_case=True)
+    return np.flatnonzero(pc.fill_null(matches, False).to_numpy(zero_copy_only=False))
+
+
+def search_positions(column_index, pattern):
+    # Positions of the rows whose value matches, from the codes of the rows instead of their values
+    return np.flatnonzero(np.isin(column_index['codes'], matching_codes(column_index, pattern)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Store column statistics and a distinct-value index next to intervention datasets')
+    parser.add_argument('data_files', nargs='*', type=Path, help='Parquet files to profile, by default every data/*.parquet.gzip')
+    args = parser.parse_args()
+
+    for data_file in args.data_files or sorted(DATA_PATH.glob('*.parquet.gzip')):
+        print(*profile_dataset(data_file))
@@ -1,130 +1,190 @@
-import pyarrow.parquet as pq
+import argparse
+import re
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 from scripts.paths import DATA_PATH, INFORMATION_PATH, LOCATION_PATH
+from scripts.storage import read_table, write_table
+from scripts.timestamps import parse_timestamps
 
+# Intervention id, unique within a source
+ID_COLUMN = "mission_id"
 
-def extract_arrests():
-    # Load the interventions data
-    intervention1 = (
-        pq.ParquetFile(DATA_PATH / "interventions1.parquet.gzip").read().to_pandas()
-    )
-    intervention2 = (
-        pq.ParquetFile(DATA_PATH / "interventions2.parquet.gzip").read().to_pandas()
-    )
-    intervention3 = (
-        pq.ParquetFile(DATA_PATH / "interventions3.parquet.gzip").read().to_pandas()
-    )
-    intervention4 = (
-        pq.ParquetFile(DATA_PATH / "interventions_bxl.parquet.gzip").read().to_pandas()
-    )
-    intervention5 = (
-        pq.ParquetFile(DATA_PATH / "interventions_bxl2.parquet.gzip").read().to_pandas()
-    )
+TIMESTAMP_COLUMNS = ["t0", "t1", "t1confirmed", "t2", "t3", "t4", "t5", "t6", "t7", "t9"]
 
-    # Rename columns
-    for intervention_df in [
-        intervention1,
-        intervention2,
-        intervention3,
-        intervention4,
-        intervention5,
-    ]:
-        intervention_df.columns = (
-            intervention_df.columns.str.lower()
-            .str.replace(" ", "_")
-            .str.replace(r"\(|\)", "", regex=True)
-            .str.strip("_")
-        )
-    intervention4 = intervention4.rename(
-        columns={"calculated_distance_destination_": "calculated_distance_destination"}
-    )
-    intervention5 = intervention5.rename(
-        columns={
+# Relevant keywords of arrests in the event type
+ARREST_PATTERN = "hartstilstand|cardiac|cardiaal|borst|chest"
+
+# Combined columns the extra arrest features are computed from, always read
+FEATURE_COLUMNS = [
+    "latitude_intervention",
+    "longitude_intervention",
+    "eventlevel_trip",
+    "calculated_traveltime_destinatio",
+    "waiting_time",
+    "abandon_reason",
+    "t0",
+    "t1",
+    "t3",
+    "t4",
+    "t5",
+    "t6",
+]
+
+# How every intervention file maps onto the combined schema (the source number is its position + 1):
+# - renames: renamed columns, after lowercasing and replacing spaces with underscores
+# - severity_column: column the numeric event severity is extracted from (N5 -> 5, or P033 N05 - TRAUMA -> 5)
+# - merge_languages: columns split into _nl and _fr variants, combined into one
+# - timestamps: format of every date column, "sas" (01JUN22:00:02:45), "iso" (2022-06-01 00:02:45.1234567 +00:00)
+#   or "iso_offset" (ISO with some entries in shifted hours, e.g. 2022-09-06 11:49:21.5868598 +02:00)
+SOURCES = [
+    *(
+        {
+            "file": f"interventions{i}.parquet.gzip",
+            "timestamps": {col: "sas" if col in ["t0", "t1"] else "iso" for col in TIMESTAMP_COLUMNS},
+        }
+        for i in [1, 2, 3]
+    ),
+    {
+        "file": "interventions_bxl.parquet.gzip",
+        "renames": {"calculated_distance_destination_": "calculated_distance_destination"},
+        "timestamps": dict.fromkeys(TIMESTAMP_COLUMNS, "iso_offset"),
+    },
+    {
+        "file": "interventions_bxl2.parquet.gzip",
+        "renames": {
             "eventtype_and_eventlevel": "eventtype_trip",
             "ic_description_nl": "ic_description",
             "description_nl": "description",
-        }
-    )
+        },
+        "severity_column": "eventtype_trip",
+        "strip_severity_zeros": True,
+        "merge_languages": [
+            "vector_type",
+            "abandon_reason",
+            "permanence_long_name",
+            "permanence_short_name",
+            "service_name",
+        ],
+        # interventions_bxl2 has no t1confirmed nor t9
+        "timestamps": {col: "sas" for col in TIMESTAMP_COLUMNS if col not in ["t1confirmed", "t9"]},
+    },
+]
+
+
+def normalise_column_name(name):
+    return re.sub(r"\(|\)", "", name.lower().replace(" ", "_")).strip("_")
+
+
+def source_column_names(schema, source):
+    # Combined column name of every column in the source file
+    renames = source.get("renames", {})
+    return {
+        name: renames.get(normalise_column_name(name), normalise_column_name(name))
+        for name in schema.names
+    }
+
+
+def _projected_columns(column_names, source, columns):
+    # Source columns needed to produce the requested combined columns
+    if columns is None:
+        return list(column_names)
+    needed = {"eventtype_trip", ID_COLUMN, source.get("severity_column", "eventlevel_trip"), *FEATURE_COLUMNS, *columns}
+    needed |= {f"{col}_{language}" for col in source.get("merge_languages", []) if col in needed for language in ["nl", "fr"]}
+    return [name for name, column_name in column_names.items() if column_name in needed]
+
+
+def read_source(source, data_path=DATA_PATH, columns=None, batch_size=65536, known_ids=None):
+    # Stream the file in batches, keeping only the projected columns of arrests (not in known_ids, if given),
+    # so memory is bounded by one batch of the file plus the (much smaller) arrests
+    parquet_file = pq.ParquetFile(Path(data_path) / source["file"])
+    column_names = source_column_names(parquet_file.schema_arrow, source)
+    projection = _projected_columns(column_names, source, columns)
+    event_column = next(name for name in projection if column_names[name] == "eventtype_trip")
+    id_column = next((name for name in projection if column_names[name] == ID_COLUMN), None)
+    if known_ids is not None and id_column is None:
+        raise ValueError(f"{source['file']} has no {ID_COLUMN} column to find new interventions with")
+    if known_ids is not None:
+        # is_in needs the value set in the type of the id column
+        known_ids = pc.cast(known_ids, parquet_file.schema_arrow.field(id_column).type)
+
+    batches = []
+    for batch in parquet_file.iter_batches(batch_size=batch_size, columns=projection):
+        is_arrest = pc.match_substring_regex(batch.column(event_column), ARREST_PATTERN, ignore_case=True)
+        if known_ids is not None:
+            is_arrest = pc.and_(is_arrest, pc.invert(pc.is_in(batch.column(id_column), value_set=known_ids)))
+        batches.append(batch.filter(is_arrest))
+    schema = pa.schema([parquet_file.schema_arrow.field(name) for name in projection])
+    table = pa.Table.from_batches(batches, schema=schema)
+    return table.rename_columns([column_names[name] for name in projection])
+
+
+def normalise_source(table, source, source_number):
+    # Convert date columns to datetime, before converting the table to pandas
+    for col, timestamp_format in source["timestamps"].items():
+        if col in table.column_names:
+            index = table.column_names.index(col)
+            table = table.set_column(index, col, parse_timestamps(table.column(col).combine_chunks(), timestamp_format))
+
+    intervention = table.to_pandas()
 
     # Extract numeric event severity from event level (N5 -> 5), or event type (P033 N05 - TRAUMA -> 5)
-    for intervention in [intervention1, intervention2, intervention3, intervention4]:
-        intervention["eventlevel_trip"] = intervention["eventlevel_trip"].str.extract(
-            r"N(\d+)", expand=False
-        )
-    intervention5["eventlevel_trip"] = (
-        intervention5["eventtype_trip"]
-        .str.extract(r"N(\d+)", expand=False)
-        .str.lstrip("0")
-    )
+    severity_column = source.get("severity_column", "eventlevel_trip")
+    if severity_column in intervention:
+        intervention["eventlevel_trip"] = intervention[severity_column].str.extract(r"N(\d+)", expand=False)
+        if source.get("strip_severity_zeros"):
+            intervention["eventlevel_trip"] = intervention["eventlevel_trip"].str.lstrip("0")
 
     # Combine both NL & FR columns into one
-    for col in [
-        "vector_type",
-        "abandon_reason",
-        "permanence_long_name",
-        "permanence_short_name",
-        "service_name",
-    ]:
-        intervention5[col] = intervention5[f"{col}_nl"].fillna(
-            intervention5[f"{col}_fr"]
-        )
-        intervention5.drop(columns=[f"{col}_nl", f"{col}_fr"], inplace=True)
-
-    # Convert date columns to datetime
-    for col in ["t0", "t1", "t1confirmed", "t2", "t3", "t4", "t5", "t6", "t7", "t9"]:
-        # intervention1/2/3 has different date formats for different columns
-        for intervention in [intervention1, intervention2, intervention3]:
-            if col in ["t0", "t1"]:
-                intervention[col] = pd.to_datetime(
-                    intervention[col], format="%d%b%y:%H:%M:%S"
-                )
-            else:
-                intervention[col] = pd.to_datetime(
-                    intervention[col].str.replace("+00:00", "").str.strip(),
-                    format="%Y-%m-%d %H:%M:%S.%f",
-                )
-
-        # intervention4 has some date entries with shifted hours (e.g. 2022-09-06 11:49:21.5868598 +02:00)
-        dt_col = intervention4[col].str.replace("+00:00", "")
-        hour_shift = (
-            dt_col.str.extract(r"\+(\d+):00", expand=False).astype(float).fillna(0)
-        )
-        intervention4[col] = pd.to_datetime(
-            dt_col.str.replace(r"\+(\d+):00", "", regex=True).str.strip(),
-            format="%Y-%m-%d %H:%M:%S.%f",
-        ) - pd.to_timedelta(hour_shift, unit="h")
-
-        # intervention5 has no t1confirmed nor t9
-        if col not in ["t1confirmed", "t9"]:
-            intervention5[col] = pd.to_datetime(
-                intervention5[col], format="%d%b%y:%H:%M:%S"
-            )
+    for col in source.get("merge_languages", []):
+        if f"{col}_nl" in intervention:
+            intervention[col] = intervention[f"{col}_nl"].fillna(intervention[f"{col}_fr"])
+            intervention.drop(columns=[f"{col}_nl", f"{col}_fr"], inplace=True)
 
     # Add data source to identify which dataset the intervention came from
-    for i, intervention in enumerate(
-        [intervention1, intervention2, intervention3, intervention4, intervention5]
-    ):
-        intervention["source"] = i + 1
-
-    # Combine all interventions
-    interventions = pd.concat(
-        [intervention1, intervention2, intervention3, intervention4, intervention5],
-        axis=0,
-        join="outer",
-        ignore_index=True,
-    )
+    intervention["source"] = source_number
 
     # Lowercase all string columns
-    for col in interventions.select_dtypes(include=["object"]).columns:
-        interventions[col] = interventions[col].str.lower()
+    for col in intervention.select_dtypes(include=["object"]).columns:
+        intervention[col] = intervention[col].str.lower()
+    return intervention
+
+
+def _normalise_source_table(data_path, source, source_number, columns, batch_size, known_ids):
+    # Run in a worker process, the arrests are sent back as an Arrow table (cheap to serialise) instead of a DataFrame
+    intervention = normalise_source(read_source(source, data_path, columns, batch_size, known_ids), source, source_number)
+    return pa.Table.from_pandas(intervention, preserve_index=False)
 
-    # Filter out arrest by relevant keywords from event type
-    arrests = interventions.loc[
-        interventions["eventtype_trip"].str.contains(
-            "hartstilstand|cardiac|cardiaal|borst|chest", na=False
-        )
-    ]
+
+def load_arrests(data_path=DATA_PATH, sources=SOURCES, columns=None, batch_size=65536, workers=1, known_ids=None):
+    # Arrests of all intervention sources, optionally only reading the given combined columns besides the features.
+    # known_ids maps source numbers to intervention ids to skip, e.g. the ones already extracted before.
+    known_ids = [(known_ids or {}).get(i + 1) for i in range(len(sources))] if known_ids is not None else repeat(None)
+    if workers > 1:
+        # Normalise the sources concurrently, one process per source
+        with ProcessPoolExecutor(max_workers=min(workers, len(sources))) as executor:
+            tables = executor.map(
+                _normalise_source_table,
+                repeat(data_path),
+                sources,
+                range(1, len(sources) + 1),
+                repeat(columns),
+                repeat(batch_size),
+                known_ids,
+            )
+            interventions = [table.to_pandas() for table in tables]
+    else:
+        interventions = [
+            normalise_source(read_source(source, data_path, columns, batch_size, source_known_ids), source, i + 1)
+            for i, (source, source_known_ids) in enumerate(zip(sources, known_ids))
+        ]
+    arrests = pd.concat(interventions, axis=0, join="outer", ignore_index=True)
 
     # Extract normalized latitude and longitude of arrests
     arrests = arrests.dropna(subset=["latitude_intervention", "longitude_intervention"])
@@ -155,14 +215,57 @@ def extract_arrests():
 
     arrests['no_control'] = 'no control'
 
-    # Save the arrests data to a CSV file
-    arrests.to_csv(INFORMATION_PATH / "arrests.csv", index=False)
+    return arrests
+
+
+def extract_arrests(data_path=DATA_PATH, columns=None, batch_size=65536, workers=1):
+    arrests = load_arrests(data_path, columns=columns, batch_size=batch_size, workers=workers)
+
+    # Save the arrests data
+    write_table(arrests, INFORMATION_PATH, "arrests")
 
-    # Save the arrest locations to a CSV file
-    arrests[["latitude_intervention", "longitude_intervention"]].rename(
+    # Save the arrest locations
+    write_table(
+        arrests[["latitude_intervention", "longitude_intervention"]].rename(
+            columns={"latitude_intervention": "lat", "longitude_intervention": "lon"}
+        ),
+        LOCATION_PATH,
+        "arrests",
+    )
+
+
+def append_new_arrests(data_path=DATA_PATH, columns=None, batch_size=65536, workers=1):
+    # Only extract interventions whose id is not in the arrests data yet, and append them to it.
+    # An intervention can have several rows (one per vehicle), these are expected in the same export.
+    # Arrests keep their position, so distances and comparisons computed before stay valid for them.
+    # Returns the number of arrests before and after appending.
+    existing_arrests = read_table(INFORMATION_PATH, "arrests")
+    existing_locations = read_table(LOCATION_PATH, "arrests")
+    if len(existing_locations) != len(existing_arrests):
+        raise ValueError("The arrest locations do not match the arrests data, extract all arrests again")
+    # Plain (not dictionary encoded) value sets, is_in only matches them against columns of the same type
+    known_ids = {
+        source: pa.array(np.asarray(ids.unique()))
+        for source, ids in existing_arrests.groupby("source", observed=True)[ID_COLUMN]
+    }
+    new_arrests = load_arrests(data_path, columns=columns, batch_size=batch_size, workers=workers, known_ids=known_ids)
+    print(f"Appending {len(new_arrests)} new arrests to the {len(existing_arrests)} extracted before")
+    if new_arrests.empty:
+        return len(existing_arrests), len(existing_arrests)
+
+    write_table(pd.concat([existing_arrests, new_arrests], ignore_index=True), INFORMATION_PATH, "arrests")
+    new_locations = new_arrests[["latitude_intervention", "longitude_intervention"]].rename(
         columns={"latitude_intervention": "lat", "longitude_intervention": "lon"}
-    ).to_csv(LOCATION_PATH / "arrests.csv", index=False)
+    )
+    write_table(pd.concat([existing_locations, new_locations], ignore_index=True), LOCATION_PATH, "arrests")
+    return len(existing_arrests), len(existing_arrests) + len(new_arrests)
 
 
 if __name__ == "__main__":
-    extract_arrests()
+    parser = argparse.ArgumentParser(description="Extract the arrests from all intervention sources")
+    parser.add_argument("--data-path", type=Path, default=DATA_PATH, help="Directory of the intervention files")
+    parser.add_argument("--columns", nargs="+", help="Only keep these (combined) columns besides the ones the features are computed from")
+    parser.add_argument("--batch-size", type=int, default=65536, help="Rows read from a file at a time")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes normalising the sources concurrently")
+    args = parser.parse_args()
+    extract_arrests(args.data_path, args.columns, args.batch_size, args.workers)
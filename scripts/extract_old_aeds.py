@@ -1,58 +1,35 @@
-import googlemaps
 import pyarrow.parquet as pq
 import pandas as pd
-import os
+from scripts.geocoding import Geocoder
 from scripts.paths import DATA_PATH, INFORMATION_PATH, LOCATION_PATH
+from scripts.storage import write_table
 
-GOOGLE_MAPS_API_KEY = os.environ['GOOGLE_MAPS_API_KEY']
-gmaps = googlemaps.Client(key=GOOGLE_MAPS_API_KEY)  
-
-def get_lat_lon(address):
-    # Geocode an address
-    result = gmaps.geocode(address)
-
-    # If result is not empty, extract latitude and longitude
-    if result:
-        location = result[0]['geometry']['location']
-        return location['lat'], location['lng']
-    else:
-        return None, None
 
 def extract_aed_locations():
     # Load the AED locations data
     aed_locations = pq.ParquetFile(DATA_PATH / 'aed_locations.parquet.gzip').read().to_pandas()
 
     # Get AED full addresses
-    aed_addresses = []
-    for index, location in aed_locations.iterrows():
-        number = '' if pd.isnull(location['number']) else location['number']
-        postal_code = '' if pd.isnull(location['postal_code']) else int(location['postal_code'])
-        address = f'{number} {location['address']}, {location['municipality']}, {location['province']}, Belgium {postal_code}'
-        aed_addresses.append(address)
-
-    aed_locations['full_address'] = aed_addresses
+    aed_locations['full_address'] = [
+        f"{'' if pd.isnull(number) else number} {address}, {municipality}, {province}, Belgium {'' if pd.isnull(postal_code) else int(postal_code)}"
+        for number, address, municipality, province, postal_code in zip(
+            aed_locations['number'], aed_locations['address'], aed_locations['municipality'], aed_locations['province'], aed_locations['postal_code'])
+    ]
 
     # Drop duplicate addresses
     aed_locations = aed_locations.drop_duplicates(subset=['full_address'])
 
-    # Get latitude and longitude for each AED location
-    aed_lats = []
-    aed_lons = []
-
-    for address in aed_locations['full_address']:
-        lat, lon = get_lat_lon(address)
-        aed_lats.append(lat)
-        aed_lons.append(lon)
-
-    aed_locations['lat'] = aed_lats
-    aed_locations['lon'] = aed_lons
+    # Get latitude and longitude for each AED location, addresses geocoded before are read from the cache
+    aed_coordinates = Geocoder().geocode_many(aed_locations['full_address'].tolist())
+    aed_locations['lat'] = [lat for lat, _ in aed_coordinates]
+    aed_locations['lon'] = [lon for _, lon in aed_coordinates]
 
-    # Save the arrests data to a CSV file
-    aed_locations.to_csv(INFORMATION_PATH / 'old_aeds.csv', index=False)
+    # Save the AED data
+    write_table(aed_locations, INFORMATION_PATH, 'old_aeds')
 
     # Save the AED locations data
-    aed_locations.to_csv(LOCATION_PATH / 'old_aeds.csv', index=False)
+    write_table(aed_locations[['lat', 'lon']], LOCATION_PATH, 'old_aeds')
 
 
 if __name__ == '__main__':
-    extract_aed_locations()
\ No newline at end of file
+    extract_aed_locations()
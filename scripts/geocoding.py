@@ -0,0 +1,156 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from scripts.paths import GEOCODING_CACHE_PATH
+
+
+class GoogleMapsBackend:
+    def __init__(self, api_key):
+        import googlemaps
+        self.client = googlemaps.Client(key=api_key)
+
+    def geocode(self, address):
+        # If result is not empty, extract latitude and longitude
+        result = self.client.geocode(address)
+        if result:
+            location = result[0]['geometry']['location']
+            return location['lat'], location['lng']
+        return None
+
+    def reverse_geocode(self, lat, lon):
+        # Extract the region (e.g. Vlaams Gewest) from the first result
+        result = self.client.reverse_geocode((lat, lon))
+        if result:
+            for component in result[0]['address_components']:
+                if 'administrative_area_level_1' in component['types']:
+                    return component['long_name']
+        return None
+
+
+class HttpBackend:
+    # Backend for any server answering GET /geocode?address=... with {"lat": .., "lon": ..}
+    # and GET /reverse?lat=..&lon=.. with {"region": ..}, e.g. a local stub server for offline runs
+    def __init__(self, base_url, timeout=10):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def _get(self, endpoint, **params):
+        with urllib.request.urlopen(f'{self.base_url}/{endpoint}?{urllib.parse.urlencode(params)}', timeout=self.timeout) as response:
+            return json.load(response)
+
+    def geocode(self, address):
+        result = self._get('geocode', address=address)
+        return (result['lat'], result['lon']) if result.get('lat') is not None else None
+
+    def reverse_geocode(self, lat, lon):
+        return self._get('reverse', lat=lat, lon=lon).get('region')
+
+
+def default_backend():
+    # Use the server in GEOCODING_URL if set, otherwise Google Maps
+    if 'GEOCODING_URL' in os.environ:
+        return HttpBackend(os.environ['GEOCODING_URL'])
+    return GoogleMapsBackend(os.environ['GOOGLE_MAPS_API_KEY'])
+
+
+class RateLimiter:
+    def __init__(self, requests_per_second):
+        self.interval = 1 / requests_per_second
+        self.next_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            wait_time = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+
+class GeocodingCache:
+    # Persistent results keyed by normalised address or rounded coordinates, including "not found" results
+    def __init__(self, path=GEOCODING_CACHE_PATH):
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS geocodes (kind TEXT, key TEXT, value TEXT, PRIMARY KEY (kind, key))')
+        self.lock = threading.Lock()
+
+    def get_many(self, kind, keys):
+        results = {}
+        with self.lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = self.connection.execute(
+                    f'SELECT key, value FROM geocodes WHERE kind = ? AND key IN ({",".join("?" * len(batch))})', [kind, *batch])
+                results.update((key, json.loads(value)) for key, value in rows)
+        return results
+
+    def set(self, kind, key, value):
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?)', (kind, key, json.dumps(value)))
+            self.connection.commit()
+
+
+def normalise_address(address):
+    return ' '.join(str(address).lower().replace(',', ' , ').split())
+
+
+def coordinate_key(lat, lon, decimals=5):
+    return f'{round(lat, decimals)},{round(lon, decimals)}'
+
+
+class Geocoder:
+    def __init__(self, backend=None, cache=None, max_workers=8, requests_per_second=10, max_retries=5, backoff_seconds=1):
+        self.backend = backend or default_backend()
+        self.cache = cache or GeocodingCache()
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(requests_per_second)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+
+    def _call(self, function, *args):
+        # Retry failed requests with exponential backoff and jitter
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.wait()
+            try:
+                return function(*args)
+            except Exception:
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self.backoff_seconds * 2 ** attempt * (1 + random.random()))
+
+    def _resolve(self, kind, keys, requests):
+        # Look up unique keys in the cache and request the missing ones concurrently
+        unique_keys = list(dict.fromkeys(keys))
+        results = self.cache.get_many(kind, unique_keys)
+        missing = [key for key in unique_keys if key not in results]
+
+        def request(key):
+            value = self._call(*requests[key])
+            self.cache.set(kind, key, value)
+            return key, value
+
+        if missing:
+            print(f'Requesting {len(missing)} {kind} results ({len(unique_keys) - len(missing)} cached)')
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                results.update(executor.map(request, missing))
+        return [results[key] for key in keys]
+
+    def geocode_many(self, addresses):
+        # (lat, lon) of every address, or (None, None) if it was not found
+        keys = [normalise_address(address) for address in addresses]
+        requests = {key: (self.backend.geocode, address) for key, address in zip(keys, addresses)}
+        return [tuple(result) if result else (None, None) for result in self._resolve('geocode', keys, requests)]
+
+    def reverse_geocode_many(self, locations):
+        # Region of every (lat, lon) location, or None if it was not found
+        keys = [coordinate_key(lat, lon) for lat, lon in locations]
+        requests = {key: (self.backend.reverse_geocode, lat, lon) for key, (lat, lon) in zip(keys, locations)}
+        return self._resolve('reverse_geocode', keys, requests)
@@ -0,0 +1,92 @@
+import argparse
+import heapq
+
+import numpy as np
+import pandas as pd
+from scripts.aed_index import load_aed_index
+from scripts.cache import cached_artifact
+from scripts.paths import LOCATION_PATH, DISTANCE_PATH, COMPARE_PATH
+from scripts.calculate_vital_distances import calculate_vital_distances
+from scripts.coverage import coverage_counts, within_radius
+from scripts.storage import read_table, resolve_table, table_path, write_table
+
+
+def candidate_improvements(arrest_locations, candidate_locations, best_distances, max_radius_km=None, candidate_tree=None):
+    # A candidate can only improve arrests whose current vital distance is longer than the distance to it,
+    # so query every arrest with its own vital distance as radius
+    radii = best_distances if max_radius_km is None else np.minimum(best_distances, max_radius_km)
+    coverage = within_radius(arrest_locations, candidate_locations, radii, tree=candidate_tree)
+    arrests = np.repeat(np.arange(len(arrest_locations)), coverage_counts(coverage))
+
+    # Regroup the (arrest, candidate) pairs by candidate
+    order = np.argsort(coverage.indices, kind='stable')
+    indptr = np.searchsorted(coverage.indices[order], np.arange(len(candidate_locations) + 1))
+    return indptr, arrests[order], coverage.distances[order]
+
+
+def greedy_placement(arrest_locations, candidate_locations, best_distances, budget, max_radius_km=None, candidate_tree=None):
+    # Add candidates one by one, each time picking the one that reduces the sum of vital distances the most.
+    # Gains can only shrink as AEDs are added, so stale gains are upper bounds and only the top of the heap
+    # needs re-evaluation (lazy greedy / CELF).
+    best = np.array(best_distances, dtype=float)
+    indptr, arrests, distances = candidate_improvements(arrest_locations, candidate_locations, best, max_radius_km, candidate_tree)
+
+    def gain(candidate):
+        pairs = slice(indptr[candidate], indptr[candidate + 1])
+        return np.maximum(best[arrests[pairs]] - distances[pairs], 0).sum()
+
+    candidates = np.repeat(np.arange(len(candidate_locations)), np.diff(indptr))
+    initial_gains = np.bincount(candidates, weights=best[arrests] - distances, minlength=len(candidate_locations))
+    heap = [(-g, candidate, 0) for candidate, g in enumerate(initial_gains) if g > 0]
+    heapq.heapify(heap)
+
+    selected = []
+    while heap and len(selected) < budget:
+        negative_gain, candidate, evaluated_at = heapq.heappop(heap)
+        if evaluated_at == len(selected):
+            # Gain is up to date, place the AED and update the vital distances of the arrests it improves
+            pairs = slice(indptr[candidate], indptr[candidate + 1])
+            improved = distances[pairs] < best[arrests[pairs]]
+            best[arrests[pairs][improved]] = distances[pairs][improved]
+            selected.append((candidate, -negative_gain, improved.sum(), best.sum()))
+        else:
+            g = gain(candidate)
+            if g > 0:
+                heapq.heappush(heap, (-g, candidate, len(selected)))
+
+    return pd.DataFrame(selected, columns=['potential_aed_id', 'distance_reduction', 'arrest_count', 'total_distance'])
+
+
+def place_aeds(new_aed_csv, budget, old_aed_csv='old_aeds.csv', max_radius_km=None):
+    calculate_vital_distances(old_aed_csv)
+
+    new_aed_filename = new_aed_csv.split('.')[0]
+    old_aed_filename = old_aed_csv.split('.')[0]
+    placement_name = f'{new_aed_filename}__{old_aed_filename}__greedy'
+    inputs = [resolve_table(LOCATION_PATH, 'arrests.csv'), resolve_table(LOCATION_PATH, new_aed_csv), table_path(DISTANCE_PATH, old_aed_csv), __file__]
+    if cached_artifact('greedy_placement', table_path(COMPARE_PATH, placement_name), inputs, lambda: _place_aeds(new_aed_csv, budget, old_aed_csv, max_radius_km, placement_name),
+                       params={'budget': budget, 'max_radius_km': max_radius_km}):
+        print(f'Using cached placement of {budget} AEDs from {new_aed_csv}')
+    return read_table(COMPARE_PATH, placement_name)
+
+def _place_aeds(new_aed_csv, budget, old_aed_csv, max_radius_km, placement_name):
+    print(f'Placing {budget} AEDs from {new_aed_csv} next to {old_aed_csv}')
+    arrest_locations = read_table(LOCATION_PATH, 'arrests.csv', columns=['lat', 'lon']).values
+    candidate_locations = read_table(LOCATION_PATH, new_aed_csv, columns=['lat', 'lon'])
+    old_distances = read_table(DISTANCE_PATH, old_aed_csv)
+
+    placement = greedy_placement(arrest_locations, candidate_locations[['lat', 'lon']].values, old_distances['distance'].values, budget, max_radius_km,
+                                 candidate_tree=load_aed_index(new_aed_csv).tree)
+    placement['potential_aed_lat'] = candidate_locations['lat'].values[placement['potential_aed_id']]
+    placement['potential_aed_lon'] = candidate_locations['lon'].values[placement['potential_aed_id']]
+    write_table(placement, COMPARE_PATH, placement_name)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Greedily pick the new AED locations that reduce the sum of vital distances the most')
+    parser.add_argument('new_aed_csv', help='candidate AED locations file in transformed_data/location')
+    parser.add_argument('old_aed_csv', nargs='?', default='old_aeds.csv', help='existing AED locations file in transformed_data/location')
+    parser.add_argument('--budget', type=int, default=200, help='number of AEDs to place')
+    parser.add_argument('--max-radius-km', type=float, help='ignore improvements for arrests farther than this from a candidate')
+    args = parser.parse_args()
+
+    place_aeds(args.new_aed_csv, args.budget, args.old_aed_csv, args.max_radius_km)
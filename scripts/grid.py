@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+# Latitude and longitude boundaries of the area of interest
+BELGIUM_BOUNDS = (49.5, 51.5, 2.5, 6.4)
+
+
+def regular_grid(bounds=BELGIUM_BOUNDS, lat_points=100, lon_points=100, within_belgium=False):
+    # Evenly spaced grid of latitude and longitude points within the boundaries
+    lat_start, lat_end, lon_start, lon_end = bounds
+    lat_grid, lon_grid = np.meshgrid(np.linspace(lat_start, lat_end, lat_points), np.linspace(lon_start, lon_end, lon_points))
+    grid = pd.DataFrame({'lat': lat_grid.ravel(), 'lon': lon_grid.ravel()})
+    return _clip_to_belgium(grid) if within_belgium else grid
+
+
+def adaptive_grid(arrest_locations, bounds=BELGIUM_BOUNDS, base_cells=(20, 20), max_depth=4, max_arrests_per_cell=25,
+                  min_arrests_per_cell=0, within_belgium=True):
+    # Quadtree grid: cells holding more than max_arrests_per_cell arrests are split in four, up to max_depth times.
+    # Every level is processed for all cells at once; the centers of the leaf cells are the candidate locations.
+    lat_start, lat_end, lon_start, lon_end = bounds
+    arrest_locations = np.asarray(arrest_locations, dtype=float)
+    base_lat_size = (lat_end - lat_start) / base_cells[0]
+    base_lon_size = (lon_end - lon_start) / base_cells[1]
+
+    rows, columns = (index.ravel() for index in np.meshgrid(np.arange(base_cells[0]), np.arange(base_cells[1]), indexing='ij'))
+    leaves = []
+    for level in range(max_depth + 1):
+        lat_size, lon_size = base_lat_size / 2 ** level, base_lon_size / 2 ** level
+        level_columns = base_cells[1] * 2 ** level
+
+        # Count the arrests per cell of this level with integer cell codes
+        arrest_rows = np.floor((arrest_locations[:, 0] - lat_start) / lat_size).astype(np.int64)
+        arrest_columns = np.floor((arrest_locations[:, 1] - lon_start) / lon_size).astype(np.int64)
+        in_bounds = (arrest_rows >= 0) & (arrest_rows < base_cells[0] * 2 ** level) & (arrest_columns >= 0) & (arrest_columns < level_columns)
+        arrest_codes, arrest_counts = np.unique(arrest_rows[in_bounds] * level_columns + arrest_columns[in_bounds], return_counts=True)
+
+        cell_codes = rows * level_columns + columns
+        positions = np.clip(np.searchsorted(arrest_codes, cell_codes), 0, max(len(arrest_codes) - 1, 0))
+        counts = np.where(arrest_codes[positions] == cell_codes, arrest_counts[positions], 0) if len(arrest_codes) else np.zeros(len(cell_codes), dtype=np.int64)
+
+        split = (counts > max_arrests_per_cell) & (level < max_depth)
+        keep = ~split & (counts >= min_arrests_per_cell)
+        leaves.append(pd.DataFrame({
+            'lat': lat_start + (rows[keep] + 0.5) * lat_size,
+            'lon': lon_start + (columns[keep] + 0.5) * lon_size,
+            'level': level,
+            'arrest_count': counts[keep]
+        }))
+
+        # Split cells in four children for the next level
+        rows = (2 * rows[split, None] + np.array([0, 0, 1, 1])).ravel()
+        columns = (2 * columns[split, None] + np.array([0, 1, 0, 1])).ravel()
+
+    grid = pd.concat(leaves, ignore_index=True)
+    return _clip_to_belgium(grid) if within_belgium else grid
+
+
+def _clip_to_belgium(grid):
+    # Keep the points within the land boundary of Belgium, the bounds also cover parts of its neighbours and the sea
+    from scripts.regions import in_belgium
+
+    return grid[in_belgium(grid['lat'], grid['lon'])].reset_index(drop=True)
@@ -0,0 +1,102 @@
+import threading
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from scripts.dataset_profile import load_dataset_profile, search_positions
+
+# Number of searches kept per dataset, the oldest one is dropped first
+MAX_SEARCHES = 64
+
+
+class ParquetDataset:
+    # Read-only handle on a Parquet file that reads a column only when it is first needed, and only the row
+    # groups holding the requested rows. Columns, distinct values and searches are kept once computed, so the
+    # handle can be shared between Streamlit sessions. If the file was profiled (see dataset_profile),
+    # statistics, distinct values and searches come from its profile instead of its rows.
+    def __init__(self, path):
+        self.path = Path(path)
+        self.profile = load_dataset_profile(self.path)
+        metadata = pq.read_metadata(self.path)
+        self.schema = pq.read_schema(self.path)
+        self.num_rows = metadata.num_rows
+        # Position of the first row of every row group, and the end of the last one
+        self.row_group_offsets = np.cumsum([0] + [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)])
+        self._columns = {}
+        self._distinct_values = {}
+        self._searches = {}
+        self._lock = threading.Lock()
+
+    @property
+    def columns(self):
+        return self.schema.names
+
+    @property
+    def dtypes(self):
+        # pandas dtypes of the columns, from the schema only
+        return self.schema.empty_table().to_pandas().dtypes
+
+    def statistics(self, name):
+        # Precomputed statistics of a column, or None without a profile
+        return self.profile.statistics[name] if self.profile is not None else None
+
+    def column(self, name):
+        with self._lock:
+            if name not in self._columns:
+                self._columns[name] = pq.read_table(self.path, columns=[name]).column(name).combine_chunks()
+            return self._columns[name]
+
+    def distinct_values(self, name):
+        # Sorted distinct values of a column, without nulls
+        if self.profile is not None:
+            return self.profile.index[name]['values']
+        with self._lock:
+            if name in self._distinct_values:
+                return self._distinct_values[name]
+        # Computed without holding the lock (column takes it), two sessions may both compute the same values
+        values = pc.unique(pc.drop_null(self.column(name)))
+        values = values.take(pc.sort_indices(values))
+        with self._lock:
+            return self._distinct_values.setdefault(name, values)
+
+    def search(self, name, pattern):
+        # Positions of the rows whose value contains the (case-insensitive) regular expression pattern.
+        # Raises pyarrow.ArrowInvalid if the pattern is not a valid regular expression.
+        key = (name, pattern)
+        with self._lock:
+            if key in self._searches:
+                return self._searches[key]
+        if self.profile is not None:
+            positions = search_positions(self.profile.index[name], pattern)
+        else:
+            values = self.column(name)
+            if not pa.types.is_string(values.type) and not pa.types.is_large_string(values.type):
+                values = pc.cast(values, pa.string())
+            matches = pc.match_substring_regex(values, pattern, ignore_case=True)
+            positions = np.flatnonzero(pc.fill_null(matches, False).to_numpy(zero_copy_only=False))
+        with self._lock:
+            if key not in self._searches and len(self._searches) >= MAX_SEARCHES:
+                self._searches.pop(next(iter(self._searches)))
+            return self._searches.setdefault(key, positions)
+
+    def rows(self, positions=None, start=0, stop=None):
+        # Rows at the positions (e.g. of a search), or in [start, stop), reading only their row groups
+        if positions is None:
+            positions = np.arange(start, min(stop if stop is not None else self.num_rows, self.num_rows))
+        positions = np.asarray(positions, dtype=np.int64)
+        groups = np.searchsorted(self.row_group_offsets, positions, side='right') - 1
+        row_groups = np.unique(groups)
+        if not len(row_groups):
+            return self.schema.empty_table().to_pandas()
+
+        # Position of every row within the row groups that were read
+        group_sizes = np.diff(self.row_group_offsets)[row_groups]
+        group_starts = np.cumsum(np.concatenate([[0], group_sizes[:-1]]))
+        local_positions = positions - self.row_group_offsets[groups] + group_starts[np.searchsorted(row_groups, groups)]
+
+        table = pq.ParquetFile(self.path).read_row_groups(row_groups.tolist())
+        df = table.take(pa.array(local_positions)).to_pandas()
+        df.index = positions
+        return df
@@ -6,4 +6,10 @@ TRANSFORMED_DATA_PATH = GLOBAL_ROOT_PATH / 'transformed_data'
 INFORMATION_PATH = TRANSFORMED_DATA_PATH / 'information'
 LOCATION_PATH = TRANSFORMED_DATA_PATH / 'location'
 DISTANCE_PATH = TRANSFORMED_DATA_PATH / 'distance'
-COMPARE_PATH = TRANSFORMED_DATA_PATH / 'compare'
\ No newline at end of file
+COMPARE_PATH = TRANSFORMED_DATA_PATH / 'compare'
+CACHE_PATH = TRANSFORMED_DATA_PATH / 'cache'
+INDEX_PATH = TRANSFORMED_DATA_PATH / 'index'
+GEOCODING_CACHE_PATH = TRANSFORMED_DATA_PATH / 'geocoding.sqlite'
+BELGIUM_GRID_PATH = GLOBAL_ROOT_PATH / 'be_1km.dbf'
+BELGIUM_BOUNDARY_PATH = GLOBAL_ROOT_PATH / 'belgium.geojson'
+WALKING_GRAPH_PATH = DATA_PATH / 'walking_graph'
@@ -0,0 +1,54 @@
+import argparse
+from pathlib import Path
+
+from scripts.add_province import add_province_to_comparison
+from scripts.calculate_vital_distances import append_vital_distances
+from scripts.compare_vital_distances import comparison_name, compare_vital_distances, update_comparison
+from scripts.extract_arrests import append_new_arrests, extract_arrests
+from scripts.geocoding import Geocoder
+from scripts.paths import COMPARE_PATH, DATA_PATH, INFORMATION_PATH
+from scripts.storage import resolve_table, table_path
+
+# (new AED locations, old AED locations) comparisons shown in the dashboard
+COMPARISONS = [('new_aeds_grid.csv', 'old_aeds.csv'), ('new_aeds_cluster.csv', 'old_aeds.csv')]
+
+
+def refresh_arrests(data_path=DATA_PATH, comparisons=COMPARISONS, radius_km=None, geocode=False, workers=1):
+    # Add the arrests of new interventions and update the vital distances and comparisons with them,
+    # instead of rerunning extract_arrests -> calculate_vital_distances -> compare_vital_distances on all arrests
+    if not resolve_table(INFORMATION_PATH, 'arrests').exists():
+        print('No arrests extracted yet, extracting all arrests')
+        extract_arrests(data_path, workers=workers)
+        for new_aed_csv, old_aed_csv in comparisons:
+            compare_vital_distances(new_aed_csv, old_aed_csv, radius_km=radius_km)
+        return
+
+    # Bring distances and comparisons up to date with the current arrests (from the cache if they are),
+    # as the new arrests are appended to them
+    for new_aed_csv, old_aed_csv in comparisons:
+        compare_vital_distances(new_aed_csv, old_aed_csv, radius_km=radius_km)
+
+    start, end = append_new_arrests(data_path, workers=workers)
+    if start == end:
+        return
+
+    for aed_csv in dict.fromkeys(aed_csv for comparison in comparisons for aed_csv in comparison):
+        append_vital_distances(aed_csv, start)
+
+    geocoder = Geocoder() if geocode else None
+    for new_aed_csv, old_aed_csv in comparisons:
+        update_comparison(new_aed_csv, old_aed_csv, start, radius_km)
+        name = comparison_name(new_aed_csv, old_aed_csv)
+        if table_path(COMPARE_PATH, f'{name}__with_province').exists():
+            add_province_to_comparison(name, geocoder)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Append the arrests of new interventions and update the comparisons with them')
+    parser.add_argument('--data-path', type=Path, default=DATA_PATH, help='directory of the intervention files')
+    parser.add_argument('--radius-km', type=float, help='radius the comparisons count newly covered arrests within')
+    parser.add_argument('--geocode', action='store_true', help='label new potential AEDs through the geocoding service instead of the local grid')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes normalising the sources concurrently')
+    args = parser.parse_args()
+
+    refresh_arrests(args.data_path, radius_km=args.radius_km, geocode=args.geocode, workers=args.workers)
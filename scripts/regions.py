@@ -0,0 +1,143 @@
+from functools import lru_cache
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from pyproj import Transformer
+from sklearn.neighbors import KDTree
+from scripts.paths import BELGIUM_BOUNDARY_PATH, BELGIUM_GRID_PATH, INFORMATION_PATH
+from scripts.storage import read_table
+
+# The EEA reference grid of Belgium uses ETRS89-LAEA (EPSG:3035) with 1 km cells, it covers the country plus a
+# buffer of about 15 km beyond the border, so its cells are clipped to the land boundary of Belgium
+# (belgium.geojson: the Europe/Brussels zone of timezone-boundary-builder, from OpenStreetMap, ODbL,
+# intersected with the GSHHG full resolution shoreline and simplified to about 10 m)
+GRID_CELL_SIZE = 1000
+to_laea = Transformer.from_crs('epsg:4326', 'epsg:3035', always_xy=True)
+to_wgs84 = Transformer.from_crs('epsg:3035', 'epsg:4326', always_xy=True)
+
+PROVINCE_REGIONS = {
+    'Antwerpen': 'Flanders',
+    'Limburg': 'Flanders',
+    'Oost-Vlaanderen': 'Flanders',
+    'Vlaams-Brabant': 'Flanders',
+    'West-Vlaanderen': 'Flanders',
+    'Brabant Wallon': 'Wallonia',
+    'Hainaut': 'Wallonia',
+    'Liège': 'Wallonia',
+    'Luxembourg': 'Wallonia',
+    'Namur': 'Wallonia',
+    'Bruxelles-Brussel': 'Brussels'
+}
+
+
+def project(lat, lon):
+    return to_laea.transform(np.asarray(lon, dtype=float), np.asarray(lat, dtype=float))
+
+
+def unproject(x, y):
+    lon, lat = to_wgs84.transform(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    return lat, lon
+
+
+@lru_cache(maxsize=1)
+def load_grid_origins():
+    # Origins of the 1 km cells of Belgium (the grid ships without its .shp geometry file)
+    cells = gpd.read_file(BELGIUM_GRID_PATH)
+    return cells['EOFORIGIN'].to_numpy(float), cells['NOFORIGIN'].to_numpy(float)
+
+
+@lru_cache(maxsize=1)
+def load_boundary():
+    # Land boundary of Belgium (without its territorial waters), prepared for repeated point in polygon tests
+    boundary = gpd.read_file(BELGIUM_BOUNDARY_PATH).to_crs('epsg:3035').geometry.iloc[0]
+    shapely.prepare(boundary)
+    return boundary
+
+
+@lru_cache(maxsize=1)
+def load_grid_cells():
+    # Cells of the grid clipped to the boundary, without the cells of the buffer, and whether each one lies
+    # entirely inside Belgium
+    east, north = load_grid_origins()
+    cells = shapely.box(east, north, east + GRID_CELL_SIZE, north + GRID_CELL_SIZE)
+    boundary = load_boundary()
+    inside = shapely.contains(boundary, cells)
+    border = ~inside & shapely.intersects(boundary, cells)
+    cells[border] = shapely.intersection(cells[border], boundary)
+    keep = inside | (border & (shapely.area(cells) > 0))
+    return east[keep], north[keep], cells[keep], inside[keep]
+
+
+@lru_cache(maxsize=1)
+def load_grid_raster():
+    # Raster of the grid with 1 for the cells inside Belgium, 2 for the cells on its border and 0 elsewhere,
+    # so only the points in border cells need a point in polygon test
+    east, north, _, inside = load_grid_cells()
+    columns = ((east - east.min()) // GRID_CELL_SIZE).astype(int)
+    rows = ((north - north.min()) // GRID_CELL_SIZE).astype(int)
+    raster = np.zeros((rows.max() + 1, columns.max() + 1), dtype=np.int8)
+    raster[rows, columns] = np.where(inside, 1, 2)
+    return east.min(), north.min(), raster
+
+
+@lru_cache(maxsize=1)
+def load_region_index():
+    # Index the 1 km cells clipped to the boundary, so locations abroad fall in no cell
+    east, north, cells, _ = load_grid_cells()
+    tree = shapely.STRtree(cells)
+
+    # Label every cell with the most common province of the existing AEDs inside it
+    aeds = read_table(INFORMATION_PATH, 'old_aeds', columns=['province', 'lat', 'lon']).dropna()
+    aeds = aeds[aeds['province'].isin(list(PROVINCE_REGIONS))]
+    aed_indices, cell_indices = tree.query(shapely.points(*project(aeds['lat'], aeds['lon'])), predicate='intersects')
+    votes = pd.DataFrame({'cell': cell_indices, 'province': aeds['province'].to_numpy()[aed_indices]})
+    labelled = votes.value_counts().reset_index().drop_duplicates('cell')
+    provinces = np.full(len(cells), None, dtype=object)
+    provinces[labelled['cell'].to_numpy()] = labelled['province'].to_numpy()
+
+    # Cells without AEDs get the province of the closest labelled cell
+    centres = np.column_stack([east, north]) + GRID_CELL_SIZE / 2
+    unlabelled = pd.isna(provinces)
+    _, closest = KDTree(centres[~unlabelled]).query(centres[unlabelled], k=1)
+    provinces[unlabelled] = provinces[~unlabelled][closest[:, 0]]
+
+    return tree, provinces
+
+
+def grid_cells(lat, lon):
+    # Index of the grid cell containing every location, -1 outside Belgium
+    tree, _ = load_region_index()
+    point_indices, cell_indices = tree.query(shapely.points(*project(lat, lon)), predicate='intersects')
+    cells = np.full(len(np.atleast_1d(lat)), -1)
+    # Points on a cell border intersect several cells, keep the first one
+    cells[point_indices[::-1]] = cell_indices[::-1]
+    return cells
+
+
+def in_belgium(lat, lon):
+    # Whether every location lies within the boundary of Belgium
+    east_origin, north_origin, raster = load_grid_raster()
+    x, y = project(lat, lon)
+    columns = np.floor((x - east_origin) / GRID_CELL_SIZE).astype(int)
+    rows = np.floor((y - north_origin) / GRID_CELL_SIZE).astype(int)
+    in_raster = (columns >= 0) & (columns < raster.shape[1]) & (rows >= 0) & (rows < raster.shape[0])
+    cell_states = np.zeros(len(x), dtype=np.int8)
+    cell_states[in_raster] = raster[rows[in_raster], columns[in_raster]]
+    result = cell_states == 1
+    border = cell_states == 2
+    result[border] = shapely.contains_xy(load_boundary(), x[border], y[border])
+    return result
+
+
+def assign_provinces(lat, lon):
+    # Province of every location, None outside Belgium
+    _, provinces = load_region_index()
+    cells = grid_cells(lat, lon)
+    return np.where(cells >= 0, provinces[cells], None)
+
+
+def assign_regions(lat, lon):
+    # Region (Flanders, Wallonia or Brussels) of every location, None outside Belgium
+    return np.array([PROVINCE_REGIONS.get(province) for province in assign_provinces(lat, lon)], dtype=object)
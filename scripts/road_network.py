@@ -0,0 +1,96 @@
+import argparse
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import dijkstra
+from scripts.cache import cached_artifact
+from scripts.paths import DISTANCE_PATH, LOCATION_PATH, WALKING_GRAPH_PATH
+from scripts.spatial_index import build_tree, query_nearest
+from scripts.storage import read_table, resolve_table, table_path, write_table
+
+# Sparse graphs drop explicit zeros, so zero lengths (e.g. an AED on a street node) get a negligible length instead
+MIN_LENGTH_KM = 1e-9
+
+# Street network: node locations, their ball tree to snap locations to the nearest node, and the edge list in km
+WalkingGraph = namedtuple('WalkingGraph', ['locations', 'tree', 'sources', 'targets', 'lengths'])
+
+
+def graph_files(graph_path=WALKING_GRAPH_PATH):
+    # An offline walking graph, e.g. exported from OpenStreetMap with osmnx:
+    # nodes.parquet with node_id, lat, lon and edges.parquet with source, target (node ids) and length_m
+    return [Path(graph_path) / 'nodes.parquet', Path(graph_path) / 'edges.parquet']
+
+
+def load_graph(graph_path=WALKING_GRAPH_PATH):
+    nodes_file, edges_file = graph_files(graph_path)
+    nodes = pd.read_parquet(nodes_file, columns=['node_id', 'lat', 'lon'])
+    edges = pd.read_parquet(edges_file, columns=['source', 'target', 'length_m'])
+
+    node_ids = pd.Index(nodes['node_id'])
+    sources, targets = node_ids.get_indexer(edges['source']), node_ids.get_indexer(edges['target'])
+    if (sources < 0).any() or (targets < 0).any():
+        raise ValueError('Edges refer to nodes that are not in nodes.parquet')
+    locations = nodes[['lat', 'lon']].to_numpy(dtype=float)
+    lengths = np.maximum(edges['length_m'].to_numpy(dtype=float) / 1000, MIN_LENGTH_KM)
+    return WalkingGraph(locations, build_tree(locations), sources, targets, lengths)
+
+
+def network_distances(graph, arrest_locations, aed_locations):
+    # Walking distance (in km) from every arrest to its nearest AED, and the index of that AED (-1 if unreachable).
+    # Every AED is added as a node, linked to its nearest street node, so one multi-source Dijkstra from all
+    # AED nodes gives the nearest AED of every street node. Locations are linked to their nearest street node
+    # with a straight line.
+    node_count = len(graph.locations)
+    aed_nodes, aed_offsets = query_nearest(graph.tree, aed_locations)
+    arrest_nodes, arrest_offsets = query_nearest(graph.tree, arrest_locations)
+
+    aed_ids = node_count + np.arange(len(aed_nodes))
+    rows = np.concatenate([graph.sources, aed_ids])
+    cols = np.concatenate([graph.targets, aed_nodes])
+    lengths = np.concatenate([graph.lengths, np.maximum(aed_offsets, MIN_LENGTH_KM)])
+    size = node_count + len(aed_nodes)
+
+    # Duplicate entries are summed when the matrix is built, so keep only the shortest of the parallel edges
+    # between two nodes (in either direction, e.g. a street and its sidewalk or a two-way street stored twice)
+    edges = pd.DataFrame({'row': np.minimum(rows, cols), 'col': np.maximum(rows, cols), 'length': lengths})
+    edges = edges.groupby(['row', 'col'], sort=False)['length'].min().reset_index()
+    adjacency = coo_matrix((edges['length'], (edges['row'], edges['col'])), shape=(size, size)).tocsr()
+
+    # Streets can be walked both ways
+    distances, _, sources = dijkstra(adjacency, directed=False, indices=aed_ids, min_only=True, return_predecessors=True)
+    nearest = np.where(sources[arrest_nodes] >= 0, sources[arrest_nodes] - node_count, -1)
+    return nearest, distances[arrest_nodes] + arrest_offsets
+
+
+def calculate_network_distances(aed_csv='old_aeds.csv', graph_path=WALKING_GRAPH_PATH):
+    # Cached per version of the graph files, arrests and AEDs
+    name = f'{Path(aed_csv).name.removesuffix(".csv").removesuffix(".parquet")}__walking'
+    inputs = [*graph_files(graph_path), resolve_table(LOCATION_PATH, 'arrests.csv'), resolve_table(LOCATION_PATH, aed_csv), __file__]
+    if cached_artifact('network_distances', table_path(DISTANCE_PATH, name), inputs, lambda: _calculate_network_distances(aed_csv, graph_path, name)):
+        print(f'Using cached walking distances of {aed_csv}')
+    return read_table(DISTANCE_PATH, name)
+
+
+def _calculate_network_distances(aed_csv, graph_path, name):
+    arrest_locations = read_table(LOCATION_PATH, 'arrests.csv', columns=['lat', 'lon']).values
+    aed_locations = read_table(LOCATION_PATH, aed_csv, columns=['lat', 'lon']).values
+    graph = load_graph(graph_path)
+
+    print(f'Calculating walking distances between {len(arrest_locations)} arrests and {len(aed_locations)} AED in {aed_csv} '
+          f'over {len(graph.locations)} nodes and {len(graph.lengths)} edges')
+    indices, distances = network_distances(graph, arrest_locations, aed_locations)
+
+    # Same layout as the vital distances
+    write_table(pd.DataFrame({'index': indices, 'distance': distances}), DISTANCE_PATH, name)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Calculate the walking distance from every arrest to its closest AED')
+    parser.add_argument('aed_csv', nargs='?', default='old_aeds.csv', help='AED locations file in transformed_data/location')
+    parser.add_argument('--graph-path', type=Path, default=WALKING_GRAPH_PATH, help='directory with nodes.parquet and edges.parquet')
+    args = parser.parse_args()
+
+    calculate_network_distances(args.aed_csv, args.graph_path)
@@ -0,0 +1,23 @@
+import numpy as np
+from sklearn.neighbors import BallTree
+
+EARTH_RADIUS_KM = 6371000 / 1000
+
+
+def build_tree(locations):
+    # Index (lat, lon) locations in degrees on the sphere
+    return BallTree(np.radians(np.asarray(locations, dtype=float)), metric='haversine')
+
+
+def query_nearest(tree, locations):
+    # Get the index of, and the distance (in km) to, the closest indexed location of every location
+    distances, indices = tree.query(np.radians(np.asarray(locations, dtype=float)), k=1)
+    return indices[:, 0], distances[:, 0] * EARTH_RADIUS_KM
+
+
+def nearest_locations(locations, targets):
+    # Nearest target for each location without materialising the full distance matrix.
+    # Duplicate targets are indexed once and resolved to their first occurrence, like np.argmin would.
+    unique_targets, first_index = np.unique(np.asarray(targets, dtype=float), axis=0, return_index=True)
+    indices, distances = query_nearest(build_tree(unique_targets), locations)
+    return first_index[indices], distances
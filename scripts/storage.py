@@ -0,0 +1,71 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+# Coordinates only used for display are stored as float32 (about 0.3 m resolution in Belgium)
+DISPLAY_COORDINATE_COLUMNS = [
+    'potential_aed_lat', 'potential_aed_lon', 'intervention_lat', 'intervention_lon', 'existing_aed_lat', 'existing_aed_lon',
+    'latitude_intervention', 'longitude_intervention', 'latitude_permanence', 'longitude_permanence'
+]
+INDEX_COLUMNS = ['index', 'potential_aed_id', 'intervention_id', 'existing_aed_id']
+# Intervention ids are matched against the ids of new exports, so they keep their plain type
+ID_COLUMNS = ['mission_id']
+
+
+def table_path(directory, name):
+    # Tables are named after their legacy CSV file, e.g. 'old_aeds.csv' is stored as 'old_aeds.parquet'
+    return Path(directory) / f'{Path(name).name.removesuffix(".csv").removesuffix(".parquet")}.parquet'
+
+
+def resolve_table(directory, name):
+    # Path of the file a table is read from, falling back to the legacy CSV file
+    path = table_path(directory, name)
+    return path if path.exists() else path.with_suffix('.csv')
+
+
+def _is_list_column(series):
+    # Lists when built in memory, arrays when read back from Parquet (these are unhashable, so they can't be counted
+    # or dictionary encoded)
+    if series.dtype != object or not series.notna().any():
+        return False
+    return pd.api.types.is_list_like(series.dropna().iloc[0])
+
+
+def _narrow_lists(series, dtype):
+    return series.apply(lambda values: np.asarray(values, dtype=dtype) if values is not None else None)
+
+
+def optimise_dtypes(df):
+    df = df.copy()
+    for col in df.columns:
+        if _is_list_column(df[col]):
+            # Nested lists (e.g. comparison outputs) keep their values, but narrow their element type
+            if col in DISPLAY_COORDINATE_COLUMNS:
+                df[col] = _narrow_lists(df[col], np.float32)
+            elif col in INDEX_COLUMNS:
+                df[col] = _narrow_lists(df[col], np.int32)
+        elif col in DISPLAY_COORDINATE_COLUMNS and pd.api.types.is_float_dtype(df[col]):
+            df[col] = df[col].astype(np.float32)
+        elif col in INDEX_COLUMNS and pd.api.types.is_integer_dtype(df[col]):
+            df[col] = df[col].astype(np.int32)
+        elif col not in ID_COLUMNS and (pd.api.types.is_object_dtype(df[col]) or pd.api.types.is_string_dtype(df[col])):
+            # Repeated strings (provinces, event types, ...) are dictionary encoded
+            if df[col].nunique() < len(df) / 2:
+                df[col] = df[col].astype('category')
+    return df
+
+
+def write_table(df, directory, name):
+    path = table_path(directory, name)
+    optimise_dtypes(df).to_parquet(path, index=False)
+    return path
+
+
+def read_table(directory, name, columns=None, **csv_kwargs):
+    path = resolve_table(directory, name)
+    if path.suffix == '.parquet':
+        # Memory map the file so the OS page cache is shared between processes reading it
+        return pq.read_table(path, columns=columns, memory_map=True).to_pandas()
+    return pd.read_csv(path, usecols=columns, **csv_kwargs)
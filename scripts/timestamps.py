@@ -0,0 +1,58 @@
+import pyarrow as pa
+import pyarrow.compute as pc
+
+NANOSECONDS_PER_HOUR = 3600 * 10 ** 9
+MONTHS = pa.array(['JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN', 'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC'])
+MONTH_NUMBERS = pa.array([f'{month:02d}' for month in range(1, 13)])
+
+
+def _empty_to_null(values):
+    return pc.if_else(pc.equal(values, ''), pa.scalar(None, values.type), values)
+
+
+def _check_valid(values, is_valid):
+    invalid = pc.and_(pc.is_valid(values), pc.invert(pc.fill_null(is_valid, False)))
+    if pc.any(invalid).as_py():
+        raise ValueError(f'Invalid timestamp: {pc.filter(values, invalid)[0]}')
+
+
+def parse_sas(values):
+    # SAS datetimes, e.g. 01JUN22:00:02:45, rewritten to ISO strings which Arrow casts natively.
+    # Two digit years follow strptime: 69-99 is 1969-1999, 00-68 is 2000-2068.
+    values = _empty_to_null(values)
+    month = pc.index_in(pc.utf8_upper(pc.utf8_slice_codeunits(values, 2, 5)), value_set=MONTHS)
+    _check_valid(values, pc.and_(pc.equal(pc.utf8_length(values), 16), pc.is_valid(month)))
+
+    year = pc.utf8_slice_codeunits(values, 5, 7)
+    century = pc.if_else(pc.less(year, '69'), '20', '19')
+    iso = pc.binary_join_element_wise(
+        century, year, '-', pc.take(MONTH_NUMBERS, month), '-', pc.utf8_slice_codeunits(values, 0, 2),
+        ' ', pc.utf8_slice_codeunits(values, 8, 16), ''
+    )
+    return pc.cast(iso, pa.timestamp('ns'))
+
+
+def parse_iso(values, shift_hours=False):
+    # ISO timestamps with fractional seconds and a +HH:00 suffix, e.g. 2022-09-06 11:49:21.5868598 +02:00.
+    # The suffix is dropped, or, with shift_hours, subtracted to get the time in UTC.
+    values = pc.utf8_trim_whitespace(values)
+    suffix = pc.utf8_slice_codeunits(values, -6)
+    has_offset = pc.match_like(suffix, '+__:00')
+    timestamps = pc.if_else(has_offset, pc.utf8_rtrim_whitespace(pc.utf8_slice_codeunits(values, 0, -6)), values)
+    timestamps = pc.cast(_empty_to_null(timestamps), pa.timestamp('ns'))
+
+    hours = pc.cast(pc.utf8_slice_codeunits(pc.if_else(has_offset, suffix, '+00:00'), 1, 3), pa.int64())
+    if shift_hours:
+        shift = pc.multiply(hours, NANOSECONDS_PER_HOUR)
+        return pc.cast(pc.subtract(pc.cast(timestamps, pa.int64()), shift), pa.timestamp('ns'))
+    if pc.any(pc.not_equal(hours, 0)).as_py():
+        raise ValueError('Timestamps with a non-zero offset, parse them with shift_hours=True')
+    return timestamps
+
+
+def parse_timestamps(values, timestamp_format):
+    # Parse an Arrow array of strings in one of the formats of SOURCES in extract_arrests
+    values = pc.cast(values, pa.string()) if not pa.types.is_string(values.type) else values
+    if timestamp_format == 'sas':
+        return parse_sas(values)
+    return parse_iso(values, shift_hours=timestamp_format == 'iso_offset')
@@ -0,0 +1,115 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+from scripts.aed_index import load_aed_index
+from scripts.calculate_vital_distances import calculate_vital_distances
+from scripts.paths import DISTANCE_PATH, LOCATION_PATH
+from scripts.spatial_index import EARTH_RADIUS_KM, build_tree, nearest_locations
+from scripts.storage import read_table
+
+
+class NearestAedAssignment:
+    # Closest active AED of every arrest, kept up to date while AEDs are added or removed.
+    # Ties are resolved to the lowest AED index, like a full recomputation with nearest_locations.
+    def __init__(self, arrest_locations, aed_locations, nearest=None, distances=None, aed_tree=None):
+        self.arrest_locations = np.asarray(arrest_locations, dtype=float)
+        self.aed_locations = np.asarray(aed_locations, dtype=float)
+        self.active = np.ones(len(self.aed_locations), dtype=bool)
+        if nearest is None:
+            nearest, distances = nearest_locations(self.arrest_locations, self.aed_locations)
+        self.nearest = np.array(nearest, dtype=np.int64)
+        self.distances = np.array(distances, dtype=float)
+        self.arrest_tree = build_tree(self.arrest_locations)
+        self._aed_tree = aed_tree
+
+    @classmethod
+    def from_tables(cls, aed_csv='old_aeds.csv'):
+        # Start from the stored vital distances and the persisted index of an AED set
+        calculate_vital_distances(aed_csv)
+        vital_distances = read_table(DISTANCE_PATH, aed_csv)
+        return cls(read_table(LOCATION_PATH, 'arrests.csv', columns=['lat', 'lon']).values,
+                   read_table(LOCATION_PATH, aed_csv, columns=['lat', 'lon']).values,
+                   vital_distances['index'].values, vital_distances['distance'].values, load_aed_index(aed_csv).tree)
+
+    def add_aeds(self, locations):
+        # New AEDs can only take over arrests closer to them than their current AED,
+        # so only arrests within the longest current vital distance are checked.
+        # Returns the ids of the new AEDs and the arrests that were reassigned.
+        locations = np.asarray(locations, dtype=float).reshape(-1, 2)
+        if not len(locations):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        ids = np.arange(len(self.aed_locations), len(self.aed_locations) + len(locations))
+        self.aed_locations = np.concatenate([self.aed_locations, locations])
+        self.active = np.concatenate([self.active, np.ones(len(locations), dtype=bool)])
+        self._aed_tree = None
+
+        arrests, distances = self.arrest_tree.query_radius(
+            np.radians(locations), r=self.distances.max() / EARTH_RADIUS_KM, return_distance=True)
+        aeds = np.repeat(ids, [len(row) for row in arrests])
+        arrests, distances = np.concatenate(arrests).astype(np.int64), np.concatenate(distances) * EARTH_RADIUS_KM
+        closer = distances < self.distances[arrests]
+        arrests, aeds, distances = arrests[closer], aeds[closer], distances[closer]
+
+        # Keep the closest (then lowest) new AED of every arrest
+        order = np.lexsort((aeds, distances, arrests))
+        first = np.diff(arrests[order], prepend=-1) != 0
+        arrests, aeds, distances = arrests[order][first], aeds[order][first], distances[order][first]
+        self.nearest[arrests] = aeds
+        self.distances[arrests] = distances
+        return ids, arrests
+
+    def remove_aeds(self, ids):
+        # Only the arrests served by a removed AED are reassigned, to their closest remaining AED.
+        # Returns the arrests that were reassigned.
+        ids = np.unique(np.asarray(ids, dtype=np.int64))
+        if ((ids < 0) | (ids >= len(self.aed_locations))).any():
+            raise ValueError(f'Unknown AED ids: {ids[(ids < 0) | (ids >= len(self.aed_locations))].tolist()}')
+        if not self.active[ids].all():
+            raise ValueError(f'AEDs already removed: {ids[~self.active[ids]].tolist()}')
+        # The assignment is only changed once the removal is known to be valid
+        active = self.active.copy()
+        active[ids] = False
+        if not active.any():
+            raise ValueError('Cannot remove every AED')
+        self.active = active
+        arrests = np.flatnonzero(np.isin(self.nearest, ids))
+        if len(arrests):
+            self.nearest[arrests], self.distances[arrests] = self._nearest_active(self.arrest_locations[arrests])
+        return arrests
+
+    def _nearest_active(self, locations):
+        # Query more neighbours until every location has an active AED among them, and no tie with it is cut off
+        if self._aed_tree is None:
+            self._aed_tree = build_tree(self.aed_locations)
+        k = min(8, len(self.aed_locations))
+        while True:
+            distances, indices = self._aed_tree.query(np.radians(locations), k=k)
+            active_distances = np.where(self.active[indices], distances, np.inf)
+            best = active_distances.min(axis=1)
+            if k == len(self.aed_locations) or (np.isfinite(best) & (distances[:, -1] > best)).all():
+                break
+            k = min(2 * k, len(self.aed_locations))
+        nearest = np.where(active_distances == best[:, None], indices, len(self.aed_locations)).min(axis=1)
+        return nearest, best * EARTH_RADIUS_KM
+
+    def vital_distances(self):
+        # Same layout as the stored vital distances
+        return pd.DataFrame({'index': self.nearest, 'distance': self.distances})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Evaluate the vital distances after adding or removing AEDs')
+    parser.add_argument('aed_csv', nargs='?', default='old_aeds.csv', help='AED locations file in transformed_data/location')
+    parser.add_argument('--add', nargs='+', default=[], metavar='LAT,LON', help='locations of AEDs to add')
+    parser.add_argument('--remove', nargs='+', type=int, default=[], metavar='ID', help='indices of AEDs to remove')
+    args = parser.parse_args()
+
+    assignment = NearestAedAssignment.from_tables(args.aed_csv)
+    before = assignment.distances.mean()
+    if args.remove:
+        print(f'Removing {len(args.remove)} AEDs reassigns {len(assignment.remove_aeds(args.remove))} arrests')
+    if args.add:
+        _, arrests = assignment.add_aeds([[float(value) for value in location.split(',')] for location in args.add])
+        print(f'Adding {len(args.add)} AEDs reassigns {len(arrests)} arrests')
+    print(f'Mean vital distance: {before:.3f} km -> {assignment.distances.mean():.3f} km')